@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import soundfile as sf
+
+from cache_index import get_index
+from utils import get_cache_dir
+
+#audio_buffer.py
+
+#Rendered audio kept in RAM before new buffers spill to disk-backed memmaps (SONG_MEMORY_BUDGET overrides it)
+MEMORY_BUDGET = 1024 * 1024 * 1024
+#Frames decoded at a time when writing a sidecar
+DECODE_BLOCK = 1 << 18
+SIDECAR_EXT = ".f32.npy"
+#float32 audio stored on its own, without the audio file it came from; a different extension
+#from SIDECAR_EXT, so a sidecar is never mistaken for one. Its sample rate is kept in a .json next to it.
+NATIVE_EXT = ".stem.npy"
+NATIVE_META_EXT = ".json"
+#Their float32 sidecar would be several times the file's size, so they are decoded into memory instead
+COMPRESSED_EXTS = (".flac", ".mp3", ".ogg")
+
+_in_memory_bytes = 0
+#allocations happen on render and export threads, releases in whichever thread drops the last reference;
+#reentrant, as a garbage collection inside the locked section can run _release on the same thread
+_in_memory_lock = threading.RLock()
+
+
+def get_memory_budget():
+    value = os.environ.get("SONG_MEMORY_BUDGET")
+    return int(value) if value else MEMORY_BUDGET
+
+
+def _release(nbytes):
+    global _in_memory_bytes
+    with _in_memory_lock:
+        _in_memory_bytes -= nbytes
+
+
+def allocate(channels, frames):
+    """
+    Return an uninitialised float32 (channels, frames) array.
+    Once get_memory_budget() bytes of allocations are alive, new ones are backed by an
+    anonymous temp file in the cache folder instead of RAM.
+    """
+    global _in_memory_bytes
+    nbytes = channels * frames * 4
+    budget = get_memory_budget()
+    with _in_memory_lock:
+        in_memory = _in_memory_bytes + nbytes <= budget
+        if in_memory:
+            #reserved before the array exists, so concurrent callers cannot overshoot the budget together
+            _in_memory_bytes += nbytes
+    if in_memory:
+        try:
+            data = np.empty((channels, frames), dtype=np.float32)
+        except MemoryError:
+            _release(nbytes)
+            raise
+        weakref.finalize(data, _release, nbytes)
+        return data
+    spill_dir = os.path.join(get_cache_dir(), "Spill")
+    os.makedirs(spill_dir, exist_ok=True)
+    #the file is unlinked on close; the mapping keeps the pages alive
+    with tempfile.TemporaryFile(dir=spill_dir) as f:
+        return np.memmap(f, dtype=np.float32, mode='w+', shape=(channels, frames))
+
+
+def in_cache(path):
+    """True for files inside the cache folder."""
+    cache_dir = get_cache_dir()
+    try:
+        return os.path.commonpath([os.path.abspath(path), cache_dir]) == cache_dir
+    except ValueError:
+        #different drives on Windows
+        return False
+
+
+def sidecar_path(path):
+    """
+    Float32 sidecar for an audio file: next to stems in the cache folder,
+    in the cache's Sidecars folder for files that live anywhere else.
+    """
+    path = os.path.abspath(path)
+    if in_cache(path):
+        return os.path.splitext(path)[0] + SIDECAR_EXT
+    sidecar_dir = os.path.join(get_cache_dir(), "Sidecars")
+    os.makedirs(sidecar_dir, exist_ok=True)
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    return os.path.join(sidecar_dir, digest + SIDECAR_EXT)
+
+
+def write_sidecar(path, sidecar):
+    """Decode path block by block into a channels-first float32 .npy file."""
+    with sf.SoundFile(path) as f:
+        tmp = sidecar + ".tmp"
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32,
+                                        shape=(f.channels, f.frames))
+        pos = 0
+        for block in f.blocks(blocksize=DECODE_BLOCK, dtype='float32', always_2d=True):
+            out[:, pos:pos + len(block)] = block.T
+            pos += len(block)
+        out.flush()
+        del out
+    os.replace(tmp, sidecar)
+
+
+def is_native(path):
+    """True for float32 .npy audio that is stored on its own rather than as a sidecar."""
+    return path.endswith(NATIVE_EXT)
+
+
+def is_compressed(path):
+    """True for compressed audio, which is decoded rather than memory-mapped through a sidecar."""
+    return os.path.splitext(path)[1].lower() in COMPRESSED_EXTS
+
+
+def native_meta_path(path):
+    return path[:-len(NATIVE_EXT)] + NATIVE_META_EXT
+
+
+def native_sample_rate(path):
+    with open(native_meta_path(path), "r", encoding="utf-8") as f:
+        return json.load(f)["sample_rate"]
+
+
+def write_native(path, out):
+    """
+    Convert the audio file path to standalone float32 audio at out (which ends in NATIVE_EXT),
+    with its sample rate in a small JSON file next to it.
+    """
+    #metadata first, so an existing .npy always has its sample rate
+    with open(native_meta_path(out), "w", encoding="utf-8") as f:
+        json.dump({"sample_rate": sf.info(path).samplerate}, f)
+    write_sidecar(path, out)
+
+
+class AudioBuffer:
+    """
+    Canonical audio buffer used from load through effects, playback and export.
+    Samples are float32, C-contiguous and channels-first (channels, frames),
+    which is the layout Pedalboard processes without any conversion.
+    """
+
+    def __init__(self, data, sample_rate):
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = data[np.newaxis, :]
+        self.data = np.ascontiguousarray(data)
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_file(cls, path):
+        """Decode an audio file straight to float32."""
+        if is_native(path):
+            return cls(np.load(path), native_sample_rate(path))
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        #soundfile returns (frames, channels)
+        return cls(data.T, sr)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map an audio file through its float32 sidecar, writing the sidecar first
+        if it is missing or older than the file. Pages are only read as they are played.
+        Standalone float32 files are mapped directly.
+        Sidecars count against the cache budget: next to a cached file they are added to its
+        index entry, in the Sidecars folder they are indexed (and evicted) on their own.
+        """
+        if is_native(path):
+            return cls(np.load(path, mmap_mode='r'), native_sample_rate(path))
+        sidecar = sidecar_path(path)
+        index = get_index()
+        if not os.path.exists(sidecar) or os.path.getmtime(sidecar) < os.path.getmtime(path):
+            write_sidecar(path, sidecar)
+            if in_cache(path):
+                #the file itself for cached inputs, the split folder for stems
+                #(only indexed paths are updated)
+                nbytes = os.path.getsize(sidecar)
+                index.grow(path, nbytes)
+                index.grow(os.path.dirname(os.path.abspath(path)), nbytes)
+            else:
+                index.record(sidecar, "sidecar")
+        elif not in_cache(path):
+            #mark as recently used
+            index.lookup(sidecar)
+        data = np.load(sidecar, mmap_mode='r')
+        return cls(data, sf.info(path).samplerate)
+
+    @property
+    def channels(self):
+        return self.data.shape[0]
+
+    @property
+    def frames(self):
+        return self.data.shape[1]
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return self.frames
+
+    def write(self, path, **kwargs):
+        sf.write(path, self.data.T, self.sample_rate, **kwargs)
@@ -0,0 +1,201 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+from utils import get_cache_dir
+
+#cache_index.py
+#SQLite index of everything stored in SongRemasteringCache: cached inputs and split stem folders.
+#Each entry records its size, backend and last access, so the cache can be kept under a byte budget
+#by evicting the least recently used entries.
+
+INDEX_FILE = "cache_index.sqlite3"
+#Budget for the whole cache; override with the SONG_CACHE_MAX_BYTES environment variable
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+
+def get_max_bytes():
+    value = os.environ.get("SONG_CACHE_MAX_BYTES")
+    return int(value) if value else DEFAULT_MAX_BYTES
+
+
+def path_size(path):
+    """Size in bytes of a file, or of everything under a folder."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class CacheIndex:
+    """Cache entries keyed by absolute path."""
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(get_cache_dir(), INDEX_FILE)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " path TEXT PRIMARY KEY,"
+                " backend TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            #stem storage format of a split folder (see splitter.STEM_FORMATS); NULL for inputs
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+            if "format" not in columns:
+                self._conn.execute("ALTER TABLE entries ADD COLUMN format TEXT")
+
+    def lookup(self, path):
+        """Return (backend, size, format) for a cached path and mark it as used, or None if it is not indexed."""
+        path = os.path.abspath(path)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT backend, size, format FROM entries WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE path = ?", (time.time(), path)
+                )
+        return row
+
+    def record(self, path, backend, size=None, fmt=None):
+        """Add or refresh an entry; an existing format is kept when fmt is None."""
+        path = os.path.abspath(path)
+        if size is None:
+            size = path_size(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO entries (path, backend, size, last_access, format) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET backend = excluded.backend, size = excluded.size,"
+                " last_access = excluded.last_access, format = COALESCE(excluded.format, format)",
+                (path, backend, size, time.time(), fmt),
+            )
+
+    def grow(self, path, nbytes):
+        """Add nbytes to an indexed entry's size, e.g. when files are added to a split folder."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE entries SET size = size + ? WHERE path = ?", (nbytes, os.path.abspath(path))
+            )
+
+    def forget(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE path = ?", (os.path.abspath(path),))
+
+    def entries(self):
+        """All entries as (path, backend, size, last_access), least recently used first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, backend, size, last_access FROM entries ORDER BY last_access"
+            ).fetchall()
+
+    def stats(self):
+        """{backend: (entry count, total bytes)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT backend, COUNT(*), SUM(size) FROM entries GROUP BY backend"
+            ).fetchall()
+        return {backend: (count, size or 0) for backend, count, size in rows}
+
+    def refresh(self):
+        """Re-measure every entry on disk and drop entries whose files are gone."""
+        for path, _, _, _ in self.entries():
+            if not os.path.exists(path):
+                self.forget(path)
+                continue
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE entries SET size = ? WHERE path = ?", (path_size(path), path))
+
+    def prune(self, max_bytes=None, keep=(), refresh=False):
+        """
+        Evict least recently used entries until the cache fits in max_bytes.
+        Sizes come from the index, which is kept current as entries are recorded and grown;
+        with refresh, every entry is re-measured on disk first. Paths in keep are never evicted.
+        Returns the evicted paths.
+        """
+        if max_bytes is None:
+            max_bytes = get_max_bytes()
+        if refresh:
+            self.refresh()
+        keep = {os.path.abspath(p) for p in keep}
+        live = [(path, size) for path, _, size, _ in self.entries()]
+
+        total = sum(size for _, size in live)
+        evicted = []
+        for path, size in live:
+            if total <= max_bytes:
+                break
+            if path in keep:
+                continue
+            remove_path(path)
+            self.forget(path)
+            total -= size
+            evicted.append(path)
+        return evicted
+
+
+_index = None
+
+
+def get_index():
+    """Process-wide CacheIndex for the default cache folder."""
+    global _index
+    if _index is None:
+        _index = CacheIndex()
+    return _index
+
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the song cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show cache usage per backend")
+    prune = sub.add_parser("prune", help="evict least recently used entries")
+    prune.add_argument("--max-bytes", type=int, default=None,
+                       help="budget in bytes (default: SONG_CACHE_MAX_BYTES or 20 GB)")
+    args = parser.parse_args(argv)
+
+    index = get_index()
+    if args.command == "stats":
+        total = 0
+        for backend, (count, size) in sorted(index.stats().items()):
+            print(f"{backend:10} {count:6} entries  {_format_bytes(size)}")
+            total += size
+        print(f"{'total':10} {'':6}          {_format_bytes(total)} of {_format_bytes(get_max_bytes())}")
+    else:
+        evicted = index.prune(args.max_bytes, refresh=True)
+        for path in evicted:
+            print(f"Evicted {path}")
+        print(f"{len(evicted)} entries evicted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from splitter import convert_audio, get_split_presets, split
+
+#compare_split.py
+#Compares a split preset against a reference preset: run time and per-stem SDR.
+#Without ground truth, the reference preset's stems stand in for the truth, so the SDR says how
+#closely the candidate reproduces the reference. With --truth (a folder of <stem>.wav files),
+#both presets are scored against it and the SDR delta is reported.
+
+#Frames compared at a time
+SDR_BLOCK = 1 << 18
+EPS = 1e-10
+
+
+def sdr(reference, estimate, block_size=SDR_BLOCK):
+    """Signal-to-distortion ratio in dB of the AudioBuffer estimate against reference, block by block."""
+    signal = 0.0
+    noise = 0.0
+    frames = min(reference.frames, estimate.frames)
+    for start in range(0, frames, block_size):
+        ref = reference.data[:, start:start + block_size].astype(np.float64)
+        est = estimate.data[:, start:start + block_size]
+        signal += float(np.sum(ref ** 2))
+        noise += float(np.sum((ref - est) ** 2))
+    return 10 * np.log10((signal + EPS) / (noise + EPS))
+
+
+def stem_name(path):
+    return os.path.basename(path).split(".")[0]
+
+
+def timed_split(path, preset, output_dir):
+    """Split into output_dir, away from the cache, so the time is a real separation."""
+    start = time.perf_counter()
+    stems = asyncio.run(split(path, preset, output_dir=output_dir))
+    return {stem_name(s): s for s in stems}, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a split preset's speed and quality with a reference preset.")
+    parser.add_argument("file", help="song to split")
+    parser.add_argument("--reference", choices=get_split_presets(), default="demucs")
+    parser.add_argument("--candidate", choices=get_split_presets(), default="cpu")
+    parser.add_argument("--truth", help="folder with the true stems as <stem>.wav")
+    args = parser.parse_args(argv)
+
+    path = convert_audio(args.file)
+    work_dir = tempfile.mkdtemp(prefix="compare_split_")
+    try:
+        reference, ref_time = timed_split(path, args.reference, os.path.join(work_dir, "reference"))
+        candidate, cand_time = timed_split(path, args.candidate, os.path.join(work_dir, "candidate"))
+        print(f"reference {args.reference}: {ref_time:.1f} s")
+        print(f"candidate {args.candidate}: {cand_time:.1f} s ({ref_time / cand_time:.2f}x)")
+
+        names = [name for name in reference if name in candidate]
+        if args.truth:
+            print(f"{'stem':10} {'reference':>10} {'candidate':>10} {'delta':>10}")
+            for name in names:
+                truth = AudioBuffer.from_file(os.path.join(args.truth, name + ".wav"))
+                ref_sdr = sdr(truth, AudioBuffer.from_file(reference[name]))
+                cand_sdr = sdr(truth, AudioBuffer.from_file(candidate[name]))
+                print(f"{name:10} {ref_sdr:7.2f} dB {cand_sdr:7.2f} dB {cand_sdr - ref_sdr:+7.2f} dB")
+        else:
+            print(f"{'stem':10} {'SDR vs reference':>16}")
+            for name in names:
+                value = sdr(AudioBuffer.from_file(reference[name]), AudioBuffer.from_file(candidate[name]))
+                print(f"{name:10} {value:13.2f} dB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
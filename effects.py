@@ -72,14 +72,15 @@ def get_param_configs(effect_name):
     return EFFECTS.get(effect_name, {}).get("params", [])
 
 
-def create_pedalboard(effect_name, **kwargs):
+def create_plugin(effect_name, **kwargs):
     """
-    Construct a Pedalboard instance for the given effect and parameter values.
+    Construct a single plugin for the given effect and parameter values,
+    or None for "None" / unknown effects.
     """
     eff = EFFECTS.get(effect_name)
     # No effect or "None"
     if not eff or eff["class"] is None:
-        return Pedalboard([])
+        return None
 
     cls = eff["class"]
     # Build parameter dict, using defaults where not provided
@@ -88,4 +89,59 @@ def create_pedalboard(effect_name, **kwargs):
         param_name = cfg["name"]
         params[param_name] = kwargs.get(param_name, cfg["default"])
 
-    return Pedalboard([cls(**params)])
+    return cls(**params)
+
+
+def create_pedalboard(effect_name, **kwargs):
+    """
+    Construct a Pedalboard instance for the given effect and parameter values.
+    """
+    plugin = create_plugin(effect_name, **kwargs)
+    return Pedalboard([plugin] if plugin is not None else [])
+
+
+def create_chain(chain):
+    """
+    Construct a Pedalboard for a whole chain spec: a list of (effect_name, params) pairs.
+    """
+    plugins = [create_plugin(name, **params) for name, params in chain]
+    return Pedalboard([p for p in plugins if p is not None])
+
+
+def update_plugin(plugin, effect_name, **kwargs):
+    """
+    Set the given parameter values on an existing plugin in place.
+    """
+    for cfg in get_param_configs(effect_name):
+        param_name = cfg["name"]
+        if param_name in kwargs and getattr(plugin, param_name) != kwargs[param_name]:
+            setattr(plugin, param_name, kwargs[param_name])
+
+
+def update_pedalboard(board, old_chain, new_chain):
+    """
+    Incremental counterpart of create_chain: given a board built from old_chain, return a board for new_chain.
+    Plugins of the same effect are kept (in order) and have their parameters updated in place,
+    so internal state such as reverb tails survives edits. The same board is returned
+    when only parameters changed.
+    """
+    old = [name for name, _ in old_chain if EFFECTS.get(name, {}).get("class") is not None]
+    old_plugins = list(board)
+    plugins = []
+    j = 0
+    for name, params in new_chain:
+        plugin = None
+        for k in range(j, len(old)):
+            if old[k] == name:
+                plugin = old_plugins[k]
+                update_plugin(plugin, name, **params)
+                j = k + 1
+                break
+        if plugin is None:
+            plugin = create_plugin(name, **params)
+        if plugin is not None:
+            plugins.append(plugin)
+
+    if len(plugins) == len(old_plugins) and all(a is b for a, b in zip(plugins, old_plugins)):
+        return board
+    return Pedalboard(plugins)
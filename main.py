@@ -1,11 +1,9 @@
 import sys
 import os
 import asyncio
+import threading
 from os.path import basename
 
-import soundfile as sf
-import numpy as np
-import sounddevice as sd
 from PyQt6.QtGui import QPixmap, QFont, QColor
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton,
@@ -18,8 +16,19 @@ from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
 from pedalboard import Pedalboard
 
 import utils
-from effects import get_available_effects, get_param_configs
-from splitter import convert_audio, demucs_split, spleeter_split
+from audio_buffer import AudioBuffer, allocate, is_compressed, NATIVE_EXT
+from effects import get_available_effects, get_param_configs, create_chain, update_pedalboard
+from mixdown import export_mix, render_tracks
+from mixer import Mixer
+from render_cache import render_chain, source_key
+from splitter import convert_audio, split, get_preset, get_split_presets, SplitCancelled
+
+
+#Background effect rendering (used when effects are not run live)
+RENDER_DEBOUNCE_MS = 300
+RENDER_PREVIEW_SECONDS = 10
+RENDER_PREROLL_SECONDS = 2
+RENDER_CHUNK_SECONDS = 5
 
 
 def format_time(seconds: float) -> str:
@@ -27,12 +36,61 @@ def format_time(seconds: float) -> str:
     return f"{m:02d}:{s:02d}"
 
 
+class EffectRenderThread(QThread):
+    """
+    Renders a track's effect chain off the GUI thread.
+    The region around the playhead is rendered first and spliced into the current
+    audio (preview_ready), then the whole song is rendered in chunks (rendered),
+    reusing cached chain prefixes. cancel() stops the render at the next chunk boundary.
+    """
+    preview_ready = pyqtSignal(int, object)
+    rendered = pyqtSignal(int, object)
+
+    def __init__(self, generation, chain, source, source_key, current, playhead):
+        super().__init__()
+        self.generation = generation
+        self.chain = chain
+        self.source = source
+        self.source_key = source_key
+        self.current = current
+        self.playhead = playhead
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        sr = self.source.sample_rate
+        length = len(self.source)
+
+        #render around the playhead first, so playback picks up the change right away
+        if self.current is not None and len(self.current) == length and self.playhead < length:
+            start = max(0, self.playhead - RENDER_PREROLL_SECONDS * sr)
+            end = min(length, self.playhead + RENDER_PREVIEW_SECONDS * sr)
+            region = create_chain(self.chain)(self.source.data[:, start:end], sr)
+            if self.cancelled:
+                return
+            preview = allocate(self.current.channels, self.current.frames)
+            preview[:] = self.current.data
+            preview[:, self.playhead:end] = region[:, self.playhead - start:]
+            self.preview_ready.emit(self.generation, AudioBuffer(preview, sr))
+
+        #full render, chunk by chunk so a newer request can cancel it
+        out = render_chain(self.source, self.source_key, self.chain,
+                           chunk_size=RENDER_CHUNK_SECONDS * sr,
+                           is_cancelled=lambda: self.cancelled)
+        if out is not None and not self.cancelled:
+            self.rendered.emit(self.generation, out)
+
+
 class TrackEffectWidget(QWidget):
     def __init__(self, parent_track):
         super().__init__()
         self.parent_track = parent_track
         self.locked = False
         self.effect_name = None
+        #persistent plugin for this slot, kept in sync by Track.apply_effect
+        self.plugin = None
         self.param_sliders = {}
 
         self.main_layout = QVBoxLayout()
@@ -108,7 +166,11 @@ class TrackEffectWidget(QWidget):
             slider.setRange(0, 100)
             default_norm = (cfg['default'] - cfg['min']) / (cfg['max'] - cfg['min'])
             slider.setValue(int(default_norm * 100))
-            slider.sliderReleased.connect(self.parent_track.apply_effect)
+            if self.parent_track.realtime_effects:
+                #rebuilding the live chain is cheap, so follow the slider as it moves
+                slider.valueChanged.connect(self.parent_track.apply_effect)
+            else:
+                slider.sliderReleased.connect(self.parent_track.apply_effect)
             self.params_form.addRow(cfg['name'].replace('_', ' ').title(), slider)
             self.param_sliders[cfg['name']] = (slider, cfg)
 
@@ -139,6 +201,10 @@ class TrackEffectWidget(QWidget):
 
 class Track(QWidget):
     instances = []
+    #Run the effect chain block by block inside the mixer instead of re-rendering the song
+    realtime_effects = True
+    #Memory-map stems through float32 sidecars instead of decoding them into RAM
+    mmap_stems = True
 
     def __init__(self, track_number, parent_app=None):
         super().__init__()
@@ -147,9 +213,15 @@ class Track(QWidget):
         self.original_audio_data = None
         self.audio_data = None
         self.sample_rate = None
-        self.stream = None
-        self.is_playing = False
-        self.position = 0
+        self.board = Pedalboard([])
+        #chain spec self.board was built from
+        self._chain = []
+        self.live_board = None
+        self.source_key = None
+        #frames separated so far while a split streams into this track; None once fully loaded
+        self.ready_frames = None
+        self._render_generation = 0
+        self._render_threads = []
         self.duration = 0.0
         self.muted = False
         self.soloed = False
@@ -194,11 +266,11 @@ class Track(QWidget):
 
         self.mute_checkbox = QCheckBox("Mute")
         self.mute_checkbox.setFont(QFont("Roboto", 12))
-        self.mute_checkbox.stateChanged.connect(lambda s: setattr(self, "muted", bool(s)))
+        self.mute_checkbox.stateChanged.connect(self.set_muted)
 
         self.solo_checkbox = QCheckBox("Solo")
         self.solo_checkbox.setFont(QFont("Roboto", 12))
-        self.solo_checkbox.stateChanged.connect(lambda s: setattr(self, "soloed", bool(s)))
+        self.solo_checkbox.stateChanged.connect(self.set_soloed)
 
         mute_row = QHBoxLayout()
         mute_row.addStretch()
@@ -217,6 +289,7 @@ class Track(QWidget):
         self.volume_slider = QSlider(Qt.Orientation.Horizontal)
         self.volume_slider.setRange(0, 100)
         self.volume_slider.setValue(50)
+        self.volume_slider.valueChanged.connect(self.notify_mixer)
         vol_row.addWidget(self.volume_slider)
 
         layout.addLayout(vol_row)
@@ -230,8 +303,11 @@ class Track(QWidget):
         self.add_effect_button.clicked.connect(self.add_effect)
         layout.addWidget(self.add_effect_button)
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_time)
+        #coalesce quick edits into a single background render
+        self.render_timer = QTimer()
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(RENDER_DEBOUNCE_MS)
+        self.render_timer.timeout.connect(self.start_render)
 
         default_bg = "#303030"
         default_text = "white"
@@ -295,76 +371,102 @@ class Track(QWidget):
             self._apply_track_style(self.track_color, text_color)
 
     def import_audio(self):
-        fname, _ = QFileDialog.getOpenFileName(self, "Open Audio File", "", "Audio Files (*.wav *.mp3 *.flac)")
+        fname, _ = QFileDialog.getOpenFileName(self, "Open Audio File", "", "Audio Files (*.wav *.mp3 *.flac *.stem.npy)")
         if fname:
-            self.load_audio(fname)
+            try:
+                self.load_audio(fname)
+            except Exception as e:
+                QMessageBox.critical(self, 'Error', f'Could not load {os.path.basename(fname)}: {e}')
 
     def load_audio(self, filename: str):
-        data, sr = sf.read(filename, always_2d=True)
+        if self.mmap_stems and not is_compressed(filename):
+            data = AudioBuffer.open(filename)
+        else:
+            data = AudioBuffer.from_file(filename)
         self.original_audio_data = data
-        self.sample_rate = sr
+        self.sample_rate = data.sample_rate
+        #identifies this audio in the render cache
+        self.source_key = source_key(filename)
+        #play the dry stem until the effect render lands
+        self.audio_data = data
+        self.ready_frames = None
 
         self.apply_effect()
 
-        self.duration = len(self.audio_data) / self.sample_rate
+        self.duration = self.audio_data.duration
+        self.notify_mixer()
 
         base = os.path.basename(filename)
+        if base.endswith(NATIVE_EXT):
+            base = base[:-len(NATIVE_EXT)]
         name_without_ext = os.path.splitext(base)[0]
         cleaned = name_without_ext.capitalize()
         self.label.setText(cleaned)
 
-    def audio_callback(self, outdata, frames, time, status):
-        if status:
-            print(status)
-        vol = self.volume_slider.value() / 100
-        any_solo = any(t.soloed for t in Track.instances)
-        if self.audio_data is None:
-            out = np.zeros((frames, 2))
-        else:
-            start = self.position
-            end = start + frames
-            if end <= len(self.audio_data):
-                chunk = self.audio_data[start:end]
-            else:
-                chunk = self.audio_data[start:]
-                pad = np.zeros((frames - chunk.shape[0], self.audio_data.shape[1]))
-                chunk = np.vstack((chunk, pad))
-            self.position = min(end, len(self.audio_data))
-            out = chunk * vol
-            if self.muted or (any_solo and not self.soloed):
-                out = np.zeros_like(out)
-        outdata[:] = out
-
-    def play(self):
-        if not self.is_playing and self.audio_data is not None:
-            self.stream = sd.OutputStream(samplerate=self.sample_rate,
-                                          channels=self.audio_data.shape[1],
-                                          callback=self.audio_callback)
-            self.stream.start()
-            self.timer.start(100)
-            self.is_playing = True
+    def begin_stream(self, name, channels, frames, sample_rate):
+        """
+        Start receiving a stem that is still being separated: a silent buffer of the full
+        length is filled in by append_stream() and replaced by load_audio() once the split is done.
+        """
+        self.cancel_render()
+        data = allocate(channels, frames)
+        data.fill(0)
+        data = AudioBuffer(data, sample_rate)
+        self.original_audio_data = data
+        self.audio_data = data
+        self.sample_rate = sample_rate
+        #a partial stem must never end up in the render cache
+        self.source_key = None
+        self.ready_frames = 0
+        self.live_board = self.board if self.realtime_effects and len(self.board) else None
+        self.duration = data.duration
+        self.label.setText(name.capitalize())
+        self.notify_mixer()
+
+    def append_stream(self, start, block):
+        """Copy a finished (channels, frames) section of the stem in and let the mixer play up to it."""
+        if self.ready_frames is None:
+            return
+        self.original_audio_data.data[:, start:start + block.shape[1]] = block
+        self.ready_frames = max(self.ready_frames, start + block.shape[1])
+        self.notify_mixer()
 
-    def stop(self):
-        if self.stream:
-            self.stream.stop()
-            self.stream.close()
-            self.stream = None
-        self.timer.stop()
-        self.is_playing = False
+    def unload(self):
+        """Drop this track's audio, keeping its controls and effects."""
+        self.cancel_render()
+        self.original_audio_data = None
+        self.audio_data = None
+        self.live_board = None
+        self.ready_frames = None
+        self.sample_rate = None
+        self.duration = 0.0
+        self.label.setText("No file loaded")
+        self.notify_mixer()
+
+    def volume(self):
+        return self.volume_slider.value() / 100
+
+    def set_muted(self, state):
+        self.muted = bool(state)
+        self.notify_mixer()
+
+    def set_soloed(self, state):
+        self.soloed = bool(state)
+        self.notify_mixer()
 
-    def update_time(self):
-        current = min(self.position / self.sample_rate, self.duration)
-        total = self.duration
+    def notify_mixer(self):
+        """Refresh the mixer's control snapshot after volume / mute / solo / audio changes."""
+        mixer = getattr(self.parent_app, "mixer", None)
+        if mixer is not None:
+            mixer.update_state()
 
     def add_effect(self):
         widget = TrackEffectWidget(self)
         self.effect_widgets.append(widget)
         self.effects_container.addWidget(widget)
 
-    def apply_effect(self):
-        if self.original_audio_data is None:
-            return
-        #build pedalboard chain
+    def chain_spec(self):
+        """Current effect chain as a list of (effect_name, params) pairs."""
         chain = []
         for w in self.effect_widgets:
             if w.effect_name and w.effect_name != 'None':
@@ -372,28 +474,128 @@ class Track(QWidget):
                 for name, (slider, cfg) in w.param_sliders.items():
                     norm = slider.value() / slider.maximum()
                     params[name] = cfg['min'] + (cfg['max'] - cfg['min']) * norm
-                #instantiate effect class
-                eff_cfg = get_param_configs(w.effect_name)
-                from effects import EFFECTS
-                cls = EFFECTS[w.effect_name]['class']
-                chain.append(cls(**params))
-        self.board = Pedalboard(chain)
-        self.audio_data = self.board(self.original_audio_data.copy(), self.sample_rate)
+                chain.append((w.effect_name, params))
+        return chain
+
+    def apply_effect(self):
+        if self.original_audio_data is None:
+            return
+        #reuse the existing plugin instances, only updating what changed
+        chain = self.chain_spec()
+        self.board = update_pedalboard(self.board, self._chain, chain)
+        self._chain = chain
+        active = [w for w in self.effect_widgets if w.effect_name and w.effect_name != 'None']
+        for w in self.effect_widgets:
+            w.plugin = None
+        for w, plugin in zip(active, self.board):
+            w.plugin = plugin
+        if self.realtime_effects:
+            #the mixer runs the chain on each block; swapping the reference is atomic
+            self.audio_data = self.original_audio_data
+            self.live_board = self.board if len(self.board) else None
+        else:
+            self.live_board = None
+            self.schedule_render()
+
+    def cancel_render(self):
+        """Invalidate pending and running renders."""
+        self._render_generation += 1
+        self.render_timer.stop()
+        for thread in self._render_threads:
+            thread.cancel()
+
+    def schedule_render(self):
+        self.cancel_render()
+        if not len(self.board):
+            self.audio_data = self.original_audio_data
+            self.notify_mixer()
+            return
+        self.render_timer.start()
+
+    def start_render(self):
+        if self.original_audio_data is None:
+            return
+        playhead = self.parent_app.mixer.position if self.parent_app is not None else 0
+        #the render builds its own plugins, so it never shares plugin state with another thread
+        thread = EffectRenderThread(self._render_generation, self.chain_spec(),
+                                    self.original_audio_data, self.source_key,
+                                    self.audio_data, playhead)
+        thread.preview_ready.connect(self.on_render_done)
+        thread.rendered.connect(self.on_render_done)
+        thread.finished.connect(lambda: self._render_threads.remove(thread))
+        self._render_threads.append(thread)
+        thread.start()
+
+    def on_render_done(self, generation, data):
+        #drop results from renders that were superseded while running
+        if generation != self._render_generation:
+            return
+        self.audio_data = data
+        self.notify_mixer()
+
+    def export_job(self):
+        """
+        (source, source_key, chain) for an offline render of this track.
+        An up-to-date background render is used as is; otherwise the chain is rendered
+        from the original with its own plugins, leaving the playback chain untouched.
+        """
+        if not self.realtime_effects and not self.render_timer.isActive() and not self._render_threads:
+            return self.audio_data, None, []
+        return self.original_audio_data, self.source_key, self.chain_spec()
 
 class SplitterThread(QThread):
     finished = pyqtSignal(tuple)
     error = pyqtSignal(str)
+    #segments done, segments total
+    progress = pyqtSignal(int, int)
+    cancelled = pyqtSignal()
+    #start frame, {stem name: (channels, frames) array}, sample rate, total frames
+    segment_ready = pyqtSignal(int, object, int, int)
 
     def __init__(self, path, method):
         super().__init__()
         self.path = path
         self.method = method
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Abort the split at its next segment; partial output is removed."""
+        self.cancel_event.set()
 
     def run(self):
         try:
             conv = convert_audio(self.path)
-            stems = asyncio.run(spleeter_split(conv)) if self.method == 'spleeter' else asyncio.run(demucs_split(conv))
+            #Demucs presets finish the song window by window, so stems can be played as they come in
+            stems = asyncio.run(split(conv, self.method, progress=self.progress.emit,
+                                      cancel_event=self.cancel_event, on_segment=self.segment_ready.emit))
             self.finished.emit(stems)
+        except SplitCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            if self.cancel_event.is_set():
+                self.cancelled.emit()
+            else:
+                self.error.emit(str(e))
+
+
+class ExportThread(QThread):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, jobs, path):
+        super().__init__()
+        self.jobs = jobs
+        self.path = path
+
+    def run(self):
+        try:
+            #all track chains render at once; the last step is writing the file
+            total = len(self.jobs) + 1
+            sources = render_tracks(self.jobs, progress=lambda done, _: self.progress.emit(done, total))
+            export_mix(self.path, sources, self.jobs[0][0].sample_rate)
+            self.progress.emit(total, total)
+            self.finished.emit(self.path)
         except Exception as e:
             self.error.emit(str(e))
 
@@ -517,8 +719,23 @@ class AudioApp(QWidget):
         tracks_layout = QHBoxLayout()
         tracks_layout.setSpacing(15)
 
-        default_colors = ['#FF4C4C', '#4C6FFF', '#3BCB3B', '#FFEB3B']
-        for i in range(4):
+        self.tracks_layout = tracks_layout
+        self.ensure_tracks(4)
+
+        main_layout.addLayout(tracks_layout, 1)
+
+        #one output stream for every track
+        self.mixer = Mixer(self.tracks)
+
+        self.setLayout(main_layout)
+        self.setWindowTitle('Remix Splitter')
+        self.resize(1920, 1080)
+
+    def ensure_tracks(self, count):
+        """Add tracks until there are at least count, e.g. for presets with more than four stems."""
+        default_colors = ['#FF4C4C', '#4C6FFF', '#3BCB3B', '#FFEB3B', '#FF9F40', '#B05CFF']
+        while len(self.tracks) < count:
+            i = len(self.tracks)
             tr = Track(i + 1, parent_app=self)
             default_color = default_colors[i % len(default_colors)]
             tr.track_color = default_color
@@ -529,32 +746,22 @@ class AudioApp(QWidget):
             text_color = 'black' if brightness > 128 else 'white'
             tr.setStyleSheet(f"background-color: {default_color}; color: {text_color}; border-radius: 15px")
             self.tracks.append(tr)
-            tracks_layout.addWidget(tr)
-
-        main_layout.addLayout(tracks_layout, 1)
-
-        self.setLayout(main_layout)
-        self.setWindowTitle('Remix Splitter')
-        self.resize(1920, 1080)
+            self.tracks_layout.addWidget(tr)
 
     def toggle_play_stop(self):
         if not self.is_playing:
             #check already finished
-            for t in self.tracks:
-                if t.audio_data is not None and t.position >= len(t.audio_data):
-                    t.position = 0
-                    t.update_time()
+            if self.mixer.position >= self.mixer.length():
+                self.mixer.position = 0
 
-            for t in self.tracks:
-                t.play()
+            self.mixer.start()
             self.global_timer.start(100)
 
             self.play_button.setText('Stop')
             self.play_button.setStyleSheet(self.btn_style.format('#FF0000'))
             self.is_playing = True
         else:
-            for t in self.tracks:
-                t.stop()
+            self.mixer.stop()
             self.global_timer.stop()
 
             self.play_button.setText('Play')
@@ -579,20 +786,15 @@ class AudioApp(QWidget):
         self.global_slider.setValue(0)
         self.global_time_label.setText("00:00 / 00:00")
 
+        self.mixer.stop()
+        self.mixer.position = 0
+
         #clear each track
         for t in self.tracks:
-            t.stop()
-
-            #clear audio data
-            t.original_audio_data = None
-            t.audio_data = None
-            t.sample_rate = None
-            t.position = 0
-            t.duration = 0.0
+            #clear audio data and its label
+            t.unload()
 
             #reset UI
-            t.label.setText("No file loaded")
-
             t.volume_slider.setValue(50)
             t.mute_checkbox.setChecked(False)
             t.solo_checkbox.setChecked(False)
@@ -602,9 +804,11 @@ class AudioApp(QWidget):
                 w.setParent(None)
             t.effect_widgets.clear()
 
+        self.mixer.update_state()
+
     def update_global_progress(self):
-        #figure out the furthest playback position and total length
-        max_pos = 0
+        #shared playback position and total length
+        max_pos = self.mixer.position
         max_len = 1
         sample_rate = None
         for t in self.tracks:
@@ -614,15 +818,11 @@ class AudioApp(QWidget):
             if length > max_len:
                 max_len = length
                 sample_rate = t.sample_rate
-            if t.position > max_pos:
-                max_pos = t.position
 
         if self.is_playing and max_pos >= max_len:
             # stop playback
-            for t in self.tracks:
-                t.stop()
-                t.position = 0
-                t.update_time()
+            self.mixer.stop()
+            self.mixer.position = 0
             self.global_timer.stop()
             # reset UI
             self.global_slider.blockSignals(True)
@@ -659,12 +859,12 @@ class AudioApp(QWidget):
         row = QHBoxLayout(); row.addWidget(file_edit); row.addWidget(browse)
         form.addRow('File', row)
 
-        method = QComboBox(); method.addItems(["Demucs", "Spleeter"])
+        method = QComboBox(); method.addItems(get_split_presets())
         form.addRow('Method', method)
 
         layout.addLayout(form)
         go = QPushButton('Split')
-        go.clicked.connect(lambda: self.handle_split(dialog, file_edit.text(), method.currentText().lower()))
+        go.clicked.connect(lambda: self.handle_split(dialog, file_edit.text(), method.currentText()))
         layout.addWidget(go)
         dialog.setLayout(layout)
         dialog.exec()
@@ -679,81 +879,118 @@ class AudioApp(QWidget):
         from os.path import basename
         self.now_playing_label.setText(f"Now playing: {basename(path)}")
 
-        #progress bar
-        self.progress = QProgressDialog('Splitting in progress…', None, 0, 0, self)
+        #background task
+        self.splitter_thread = SplitterThread(path, method)
+        #stem order of the preset decides which track each stem goes to
+        self.split_stems = get_preset(method)["stems"]
+        self.ensure_tracks(len(self.split_stems))
+        #tracks past this preset's stems would keep playing the previous song
+        for t in self.tracks[len(self.split_stems):]:
+            t.unload()
+
+        #progress bar; indeterminate until the first segment count arrives
+        self.progress = QProgressDialog('Splitting in progress…', 'Cancel', 0, 0, self)
         self.progress.setWindowTitle('Please wait')
-        self.progress.setWindowModality(Qt.WindowModality.ApplicationModal)
-        self.progress.setCancelButton(None)
+        #not modal, so the finished part of the song can be played while the split continues
+        self.progress.setWindowModality(Qt.WindowModality.NonModal)
+        self.progress.setAutoClose(False)
+        self.progress.setAutoReset(False)
+        self.progress.canceled.connect(self.splitter_thread.cancel)
         self.progress.show()
 
-        #background task
-        self.splitter_thread = SplitterThread(path, method)
         self.splitter_thread.finished.connect(self.on_split_finished)
         self.splitter_thread.error.connect(self.on_split_error)
+        self.splitter_thread.progress.connect(self.on_split_progress)
+        self.splitter_thread.cancelled.connect(self.on_split_cancelled)
+        self.splitter_thread.segment_ready.connect(self.on_split_segment)
         self.splitter_thread.start()
 
+    def on_split_progress(self, done, total):
+        self.progress.setMaximum(total)
+        self.progress.setValue(done)
+        self.progress.setLabelText(f'Splitting in progress… ({done}/{total} segments)')
+
+    def on_split_segment(self, start, stems, sample_rate, total):
+        #same track order as on_split_finished
+        for name, block in stems.items():
+            i = self.split_stems.index(name + ".wav")
+            t = self.tracks[i]
+            if start == 0:
+                t.begin_stream(name, block.shape[0], total, sample_rate)
+            t.append_stream(start, block)
+
     def on_split_finished(self, stems):
         self.progress.close()
-        for i, t in enumerate(self.tracks[:4]):
-            t.load_audio(stems[i])
-        QMessageBox.information(self, 'Done', 'Splitting complete!')
         self.splitter_thread = None
+        try:
+            for t, stem in zip(self.tracks, stems):
+                t.load_audio(stem)
+        except Exception as e:
+            QMessageBox.critical(self, 'Error', f'Could not load {os.path.basename(stem)}: {e}')
+            return
+        QMessageBox.information(self, 'Done', 'Splitting complete!')
 
     def on_split_error(self, err_msg):
         self.progress.close()
         QMessageBox.critical(self, 'Error', err_msg)
         self.splitter_thread = None
 
-    def seek_all(self, value):
-        was_playing = self.is_playing
-
-        if was_playing:
-            for t in self.tracks:
-                t.stop()
-            self.global_timer.stop()
-            self.play_button.setText('Play')
-            self.is_playing = False
+    def on_split_cancelled(self):
+        self.progress.close()
+        #drop stems that were only partly streamed in
+        for t in self.tracks:
+            if t.ready_frames is not None:
+                if self.is_playing:
+                    self.toggle_play_stop()
+                t.unload()
+        self.now_playing_label.setText('')
+        QMessageBox.information(self, 'Cancelled', 'Splitting was cancelled.')
+        self.splitter_thread = None
 
+    def seek_all(self, value):
         max_len = 1
         for t in self.tracks:
             if t.audio_data is not None:
                 max_len = max(max_len, len(t.audio_data))
         target = int((value / 1000) * max_len)
-
-        for t in self.tracks:
-            if t.audio_data is not None:
-                t.position = min(target, len(t.audio_data))
-                t.update_time()
-
-        if was_playing:
-            for t in self.tracks:
-                t.play()
-            self.global_timer.start(100)
-            self.play_button.setText('Stop')
-
-            self.is_playing = True
+        #the running stream picks this up at its next block
+        self.mixer.seek(target)
 
     def export_tracks(self):
-        mixed, sr = None, None
+        jobs = []
         for t in self.tracks:
             if t.audio_data is None: continue
-            data = t.audio_data.copy() * (t.volume_slider.value()/100)
-            if mixed is None:
-                mixed, sr = data, t.sample_rate
-            else:
-                maxlen = max(mixed.shape[0], data.shape[0])
-                pad1 = np.zeros((maxlen-mixed.shape[0], mixed.shape[1]))
-                pad2 = np.zeros((maxlen-data.shape[0], data.shape[1]))
-                mixed = np.vstack((mixed,pad1)) + np.vstack((data,pad2))
-        if mixed is None:
+            source, source_key, chain = t.export_job()
+            jobs.append((source, source_key, chain, t.volume_slider.value()/100))
+        if not jobs:
             QMessageBox.warning(self, 'No Tracks', 'Load at least one track')
             return
-        mx = np.max(np.abs(mixed))
-        if mx>1: mixed/=mx
         save,_ = QFileDialog.getSaveFileName(self, 'Save Mix', '', "WAV (*.wav)")
-        if save:
-            sf.write(save, mixed, sr)
-            QMessageBox.information(self, 'Done', f'Saved to {save}')
+        if not save:
+            return
+
+        self.export_progress = QProgressDialog('Exporting…', None, 0, len(jobs) + 1, self)
+        self.export_progress.setWindowTitle('Please wait')
+        self.export_progress.setWindowModality(Qt.WindowModality.ApplicationModal)
+        self.export_progress.setCancelButton(None)
+        self.export_progress.show()
+
+        #tracks render in parallel on a worker pool, off the GUI thread
+        self.export_thread = ExportThread(jobs, save)
+        self.export_thread.progress.connect(lambda done, total: self.export_progress.setValue(done))
+        self.export_thread.finished.connect(self.on_export_finished)
+        self.export_thread.error.connect(self.on_export_error)
+        self.export_thread.start()
+
+    def on_export_finished(self, path):
+        self.export_progress.close()
+        QMessageBox.information(self, 'Done', f'Saved to {path}')
+        self.export_thread = None
+
+    def on_export_error(self, err_msg):
+        self.export_progress.close()
+        QMessageBox.critical(self, 'Error', err_msg)
+        self.export_thread = None
 
 if __name__ == '__main__':
     utils.check_demucs_installed()
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import soundfile as sf
+
+from render_cache import render_chain
+
+#mixdown.py
+
+#Frames mixed and written per step
+EXPORT_BLOCK = 1 << 16
+
+
+def mix_block(sources, start, out):
+    """
+    Sum every (AudioBuffer, gain) source's frames [start, start + len(out)) into out,
+    a (frames, channels) buffer.
+    """
+    out.fill(0)
+    for buf, gain in sources:
+        n = min(len(out), buf.frames - start)
+        if n <= 0 or gain == 0:
+            continue
+        #sources are channels-first, soundfile wants (frames, channels); mono broadcasts
+        out[:n] += buf.data[:, start:start + n].T * gain
+
+
+def mix_length(sources):
+    return max((buf.frames for buf, _ in sources), default=0)
+
+
+def mix_peak(sources, block_size=EXPORT_BLOCK):
+    """First pass: absolute peak of the mix, computed block by block."""
+    channels = max(buf.channels for buf, _ in sources)
+    out = np.zeros((block_size, channels), dtype=np.float32)
+    peak = 0.0
+    length = mix_length(sources)
+    for start in range(0, length, block_size):
+        mix_block(sources, start, out)
+        n = min(block_size, length - start)
+        peak = max(peak, float(np.max(np.abs(out[:n]))))
+    return peak
+
+
+def export_mix(path, sources, sample_rate, block_size=EXPORT_BLOCK, normalize=True):
+    """
+    Mix (AudioBuffer, gain) sources and write them to path through sf.SoundFile, one block at a time.
+    With normalize, a first pass measures the peak and the mix is scaled down if it would clip.
+    Memory use is a couple of blocks, regardless of the song length.
+    """
+    channels = max(buf.channels for buf, _ in sources)
+    scale = 1.0
+    if normalize:
+        peak = mix_peak(sources, block_size)
+        if peak > 1:
+            scale = 1 / peak
+    out = np.zeros((block_size, channels), dtype=np.float32)
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=channels) as f:
+        length = mix_length(sources)
+        for start in range(0, length, block_size):
+            mix_block(sources, start, out)
+            n = min(block_size, length - start)
+            if scale != 1.0:
+                out[:n] *= scale
+            f.write(out[:n])
+
+
+def render_tracks(jobs, progress=None, max_workers=None):
+    """
+    Render every track's effect chain in parallel. jobs are (source AudioBuffer, source_key,
+    chain spec, gain); Pedalboard releases the GIL, so a thread pool keeps all cores busy.
+    progress(done, total) is called after each track.
+    Returns (rendered AudioBuffer, gain) sources in job order, ready for export_mix, which sums
+    them block by block; tracks without effects are passed through without a copy.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(render_chain, source, source_key, chain)
+                   for source, source_key, chain, _ in jobs]
+        for done, _ in enumerate(as_completed(futures), 1):
+            if progress is not None:
+                progress(done, len(jobs))
+        return [(future.result(), gain) for future, (_, _, _, gain) in zip(futures, jobs)]
@@ -0,0 +1,186 @@
+import numpy as np
+import sounddevice as sd
+
+#mixer.py
+
+#Fixed callback size, so the scratch buffer can be allocated once up front
+BLOCK_SIZE = 1024
+
+
+class Mixer:
+    """
+    Central playback engine: a single output stream whose callback pulls a block
+    from every track, applies volume / mute / solo and sums them.
+    Every track shares the same position, so the stems stay sample-locked.
+
+    The callback never allocates: it mixes one channel at a time through a preallocated
+    float32 scratch buffer (numpy buffers strided 2-D ufuncs with a broadcast operand,
+    which would allocate on every block) and reads gains from a snapshot that is
+    rebuilt by update_state() whenever a control changes.
+
+    Tracks with live effects (track.live_board) have their Pedalboard run on each
+    block with reset=False, so tails carry over and parameter changes are heard
+    on the next block. Only that plugin call allocates.
+
+    While a split is streaming stems in, playback stops at the last finished
+    section and continues once the next one arrives.
+
+    seek() posts a new position that the callback applies at the next block boundary,
+    crossfading from the old position over one block; the stream stays open.
+    """
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.stream = None
+        self.is_playing = False
+        self.position = 0
+        self.sample_rate = None
+        self.channels = 2
+        self._scratch = np.zeros(BLOCK_SIZE, dtype=np.float32)
+        self._fade_block = np.zeros((BLOCK_SIZE, self.channels), dtype=np.float32)
+        self._fade_in = np.linspace(0, 1, BLOCK_SIZE, dtype=np.float32)
+        self._fade_out = 1 - self._fade_in
+        #(serial, position); the serial tells the callback a new request arrived
+        self._seek_request = (0, 0)
+        self._seek_applied = 0
+        #zero-padded effect inputs, one per channel count
+        self._fx_inputs = {}
+        self._state = ()
+        self._length = 0
+
+    def loaded_tracks(self):
+        return [t for t in self.tracks if t.audio_data is not None]
+
+    def length(self):
+        """Length in samples of the longest loaded track."""
+        return max((len(t.audio_data) for t in self.loaded_tracks()), default=0)
+
+    def playable_length(self):
+        """
+        Samples that can be played: the longest track, cut back to the separation frontier
+        while a split is still streaming stems in (track.ready_frames).
+        """
+        length = self.length()
+        ready = [t.ready_frames for t in self.loaded_tracks() if t.ready_frames is not None]
+        return min([length] + ready)
+
+    def update_state(self):
+        """Snapshot volume / mute / solo so the callback never touches the widgets."""
+        any_solo = any(t.soloed for t in self.tracks)
+        state = []
+        for t in self.tracks:
+            if t.muted or (any_solo and not t.soloed):
+                continue
+            gain = t.volume()
+            if gain > 0:
+                state.append((t, np.float32(gain)))
+            if t.audio_data is not None:
+                channels = t.audio_data.channels
+                if channels not in self._fx_inputs:
+                    self._fx_inputs[channels] = np.zeros((channels, BLOCK_SIZE), dtype=np.float32)
+        self._length = self.playable_length()
+        #a single assignment, so the audio thread sees either the old or the new snapshot
+        self._state = tuple(state)
+
+    def start(self):
+        if self.is_playing:
+            return
+        loaded = self.loaded_tracks()
+        if not loaded:
+            return
+        #all stems come out of the same split, so the first track decides the rate
+        self.sample_rate = loaded[0].sample_rate
+        channels = max(t.audio_data.channels for t in loaded)
+        if channels != self.channels:
+            self.channels = channels
+            self._fade_block = np.zeros((BLOCK_SIZE, channels), dtype=np.float32)
+        self.update_state()
+        #start from silence instead of whatever tail was left from the last run
+        for t in loaded:
+            if t.live_board is not None:
+                t.live_board.reset()
+        self.stream = sd.OutputStream(samplerate=self.sample_rate,
+                                      channels=self.channels,
+                                      blocksize=BLOCK_SIZE,
+                                      dtype='float32',
+                                      callback=self.audio_callback)
+        self.stream.start()
+        self.is_playing = True
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        self.is_playing = False
+        #a seek the callback never got to
+        serial, position = self._seek_request
+        if serial != self._seek_applied:
+            self._seek_applied = serial
+            self.position = position
+
+    def seek(self, position):
+        """Move playback to position (in samples) without touching the stream."""
+        position = max(0, min(position, self._length))
+        if not self.is_playing:
+            self.position = position
+            return
+        #one tuple assignment, so the callback never sees a half-written request
+        self._seek_request = (self._seek_request[0] + 1, position)
+
+    def audio_callback(self, outdata, frames, time, status):
+        if status:
+            print(status)
+        serial, target = self._seek_request
+        if serial != self._seek_applied and frames == BLOCK_SIZE:
+            self._seek_applied = serial
+            #fade the old position out while the new one fades in
+            fade = self._fade_block
+            fade.fill(0)
+            self._mix_into(fade, self.position, frames)
+            outdata.fill(0)
+            self._mix_into(outdata, target, frames)
+            for c in range(outdata.shape[1]):
+                column = outdata[:, c]
+                np.multiply(column, self._fade_in, out=column)
+                column = fade[:, c]
+                np.multiply(column, self._fade_out, out=column)
+            np.add(outdata, fade, out=outdata)
+            self.position = min(target + frames, self._length)
+            return
+        outdata.fill(0)
+        start = self.position
+        self._mix_into(outdata, start, frames)
+        self.position = min(start + frames, self._length)
+
+    def _mix_into(self, outdata, start, frames):
+        """Add every audible track's block at start into outdata."""
+        scratch = self._scratch
+        for track, gain in self._state:
+            buf = track.audio_data
+            if buf is None:
+                continue
+            data = buf.data
+            n = min(frames, data.shape[1] - start)
+            if n <= 0:
+                continue
+            board = track.live_board
+            if board is not None:
+                #plugins always get a full block, zero-padded at the end of the track
+                fx_in = self._fx_inputs[data.shape[0]]
+                fx_in[:, :n] = data[:, start:start + n]
+                fx_in[:, n:] = 0
+                source = board(fx_in, buf.sample_rate, reset=False)
+                offset = 0
+                n = min(frames, source.shape[1])
+            else:
+                source = data
+                offset = start
+            #track buffers are channels-first, the device wants (frames, channels);
+            #mono tracks feed every output channel
+            last = source.shape[0] - 1
+            block = scratch[:n]
+            for c in range(outdata.shape[1]):
+                np.multiply(source[min(c, last), offset:offset + n], gain, out=block)
+                column = outdata[:n, c]
+                np.add(column, block, out=column)
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import sys
+
+from audio_buffer import AudioBuffer, in_cache, is_compressed, is_native
+from effects import EFFECTS
+from mixdown import export_mix, render_tracks
+from render_cache import source_key
+
+#render.py
+#Headless render engine: renders a JSON remix project to disk without the GUI.
+#
+#Project format:
+#{
+#    "normalize": true,
+#    "tracks": [
+#        {"path": "vocals.wav", "volume": 0.5, "mute": false, "solo": false,
+#         "effects": [{"name": "Reverb", "params": {"room_size": 0.4}}]}
+#    ]
+#}
+#Track paths are relative to the project file; volume is a linear gain (the GUI's slider / 100).
+
+
+def load_project(path):
+    """Read and validate a project file, resolving track paths against its folder."""
+    with open(path, "r", encoding="utf-8") as f:
+        project = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    tracks = project.get("tracks")
+    if not tracks:
+        raise ValueError(f"{path}: project has no tracks")
+    for i, track in enumerate(tracks):
+        if "path" not in track:
+            raise ValueError(f"{path}: track {i} has no path")
+        track["path"] = os.path.join(base_dir, track["path"])
+        track.setdefault("volume", 0.5)
+        track.setdefault("mute", False)
+        track.setdefault("solo", False)
+        track.setdefault("effects", [])
+        for effect in track["effects"]:
+            name = effect.get("name")
+            if name not in EFFECTS:
+                raise ValueError(f"{path}: track {i} uses unknown effect {name!r}")
+            known = {cfg["name"] for cfg in EFFECTS[name]["params"]}
+            unknown = set(effect.get("params", {})) - known
+            if unknown:
+                raise ValueError(f"{path}: {name} has no parameter(s) {', '.join(sorted(unknown))}")
+    project.setdefault("normalize", True)
+    return project
+
+
+def open_source(path):
+    """
+    Memory-map cached stems, whose sidecars live with the split; decode other files into memory,
+    so batch renders do not leave a float32 copy of every project file in the cache.
+    Compressed stems are decoded too, as their sidecars would outgrow the stems.
+    """
+    if is_native(path) or (in_cache(path) and not is_compressed(path)):
+        return AudioBuffer.open(path)
+    return AudioBuffer.from_file(path)
+
+
+def render_project(project, output_path, progress=None):
+    """Render a loaded project to output_path, applying volume / mute / solo like the GUI mixer."""
+    any_solo = any(t["solo"] for t in project["tracks"])
+    jobs = []
+    for track in project["tracks"]:
+        if track["mute"] or (any_solo and not track["solo"]):
+            continue
+        source = open_source(track["path"])
+        chain = [(e["name"], e.get("params", {})) for e in track["effects"] if e["name"] != "None"]
+        jobs.append((source, source_key(track["path"]), chain, float(track["volume"])))
+    if not jobs:
+        raise ValueError("every track is muted")
+
+    rates = {source.sample_rate for source, _, _, _ in jobs}
+    if len(rates) > 1:
+        raise ValueError(f"tracks have different sample rates: {sorted(rates)}")
+
+    sources = render_tracks(jobs, progress=progress)
+    export_mix(output_path, sources, rates.pop(), normalize=project["normalize"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render remix projects to audio files without the GUI.")
+    parser.add_argument("projects", nargs="+", help="project JSON files")
+    parser.add_argument("-o", "--output", help="output file (only with a single project)")
+    parser.add_argument("--out-dir", help="folder for the rendered files (default: next to each project)")
+    args = parser.parse_args(argv)
+
+    if args.output and len(args.projects) > 1:
+        parser.error("--output needs exactly one project; use --out-dir for batches")
+
+    failed = 0
+    for project_path in args.projects:
+        if args.output:
+            output = args.output
+        else:
+            name = os.path.splitext(os.path.basename(project_path))[0] + ".wav"
+            out_dir = args.out_dir or os.path.dirname(os.path.abspath(project_path))
+            os.makedirs(out_dir, exist_ok=True)
+            output = os.path.join(out_dir, name)
+        try:
+            render_project(load_project(project_path), output)
+            print(f"{project_path} -> {output}")
+        except Exception as e:
+            failed += 1
+            print(f"{project_path} failed: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
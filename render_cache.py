@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import OrderedDict
+
+from audio_buffer import AudioBuffer, allocate
+from effects import create_pedalboard
+
+#render_cache.py
+
+#Upper bound for all cached renders together
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+#Seconds rendered per Pedalboard call
+DEFAULT_CHUNK_SECONDS = 10
+
+
+class RenderCache:
+    """
+    LRU cache of rendered effect-chain prefixes, bounded by the total size of the stored arrays.
+    Keys are (source_key, stage_1, ..., stage_n), so the output of effects 1..n of a chain
+    can be reused when only a later effect changes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        #render threads for several tracks share the cache
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if data.nbytes > self.max_bytes:
+            return
+        #cached buffers are shared between tracks and threads, so keep them read-only
+        data.data.flags.writeable = False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.nbytes
+            self._entries[key] = data
+            self.size += data.nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+RENDER_CACHE = RenderCache()
+
+
+def source_key(path):
+    """Identify an audio file in the cache; changes when the file is rewritten."""
+    return os.path.abspath(path), os.path.getmtime(path)
+
+
+def stage_key(effect_name, params):
+    return effect_name, tuple(sorted(params.items()))
+
+
+def chunk_bounds(frames, chunk_size):
+    """
+    Yield (start, stop) pairs covering frames in chunk_size steps.
+    A short remainder is merged into the last chunk, so Pedalboard never sees
+    a block with fewer frames than channels (which makes the layout ambiguous).
+    """
+    start = 0
+    while start < frames:
+        stop = start + chunk_size
+        if frames - stop < chunk_size // 2:
+            stop = frames
+        yield start, stop
+        start = stop
+
+
+def render_chain(source, source_key, chain, cache=RENDER_CACHE,
+                 chunk_size=None, is_cancelled=None):
+    """
+    Render a chain spec (a list of (effect_name, params) pairs) over the AudioBuffer source,
+    starting from the longest prefix already in the cache and caching every new stage.
+    Stages are rendered chunk_size frames at a time into buffers from allocate(),
+    so long renders can spill to disk; returns None if is_cancelled() becomes true in between.
+    A source_key of None (audio still being streamed in) bypasses the cache.
+    """
+    if source_key is None:
+        cache = RenderCache(max_bytes=0)
+    keys = []
+    key = (source_key,)
+    for name, params in chain:
+        key = key + (stage_key(name, params),)
+        keys.append(key)
+
+    data = source
+    first = 0
+    for i in range(len(chain), 0, -1):
+        hit = cache.get(keys[i - 1])
+        if hit is not None:
+            data = hit
+            first = i
+            break
+
+    sr = source.sample_rate
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SECONDS * sr
+    for i in range(first, len(chain)):
+        name, params = chain[i]
+        board = create_pedalboard(name, **params)
+        out = allocate(data.channels, data.frames)
+        for start, stop in chunk_bounds(data.frames, chunk_size):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            out[:, start:stop] = board(data.data[:, start:stop], sr, reset=False)
+        data = AudioBuffer(out, sr)
+        cache.put(keys[i], data)
+    return data
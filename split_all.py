@@ -1,53 +1,233 @@
+import argparse
 import asyncio
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from splitter import demucs_split
+import torch
+
+from splitter import convert_audio, demucs_split_many, find_cached_split, get_preset, get_split_presets, split
+from utils import get_cache_dir
 
 
 #Split all
 
 #1: Get folder location
-#2: foreach: attempt demucs_split
+#2: skip songs that are already in the cache
+#3: split the rest on a pool of worker processes, each with its own torch thread budget;
+#   with songs_per_batch, Demucs presets pack windows from several songs into one model call
+#Progress is kept in a job manifest, so an interrupted run resumes where it stopped.
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aac"}
+MAX_ATTEMPTS = 3
+#seconds before the first retry; doubles with every attempt
+RETRY_BACKOFF = 5
+
+
+class JobManifest:
+    """
+    Persistent per-file state of a batch run (queued / running / done / failed),
+    stored in the cache folder and rewritten atomically on every change.
+    """
+
+    def __init__(self, directory, method):
+        key = hashlib.sha1(f"{os.path.abspath(directory)}|{method}".encode("utf-8")).hexdigest()
+        manifest_dir = os.path.join(get_cache_dir(), "Batches")
+        os.makedirs(manifest_dir, exist_ok=True)
+        self.path = os.path.join(manifest_dir, key + ".json")
+        self.jobs = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f).get("jobs", {})
+        self.directory = directory
+        self.method = method
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"directory": os.path.abspath(self.directory), "method": self.method,
+                       "jobs": self.jobs}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def state(self, item):
+        return self.jobs.get(item, {}).get("state")
+
+    def attempts(self, item):
+        return self.jobs.get(item, {}).get("attempts", 0)
+
+    def set(self, item, state, **info):
+        job = self.jobs.setdefault(item, {"attempts": 0})
+        job["state"] = state
+        job.update(info)
+        self.save()
 
 
 def get_files(directory):
-    try:
-        files = os.listdir(directory)
-        return [f for f in files if os.path.isfile(os.path.join(directory, f))]
-    except FileNotFoundError:
-        return "Directory not found"
-    except NotADirectoryError:
-        return 0
-    except:
-        return 1
+    """Files directly inside directory; raises OSError if it is missing or not a folder."""
+    files = os.listdir(directory)
+    return [f for f in files if os.path.isfile(os.path.join(directory, f))]
 
 
-async def split_all(directory):
+def default_workers():
+    """Roughly one job per four cores; separation models are large, so memory runs out before cores do."""
+    return max(1, (os.cpu_count() or 1) // 4)
 
-    try:
-        print("Getting files")
-        filenames = get_files(directory)
-        if filenames == 0 or filenames == 1:
-            print(f"Exception: {filenames}")
-            raise Exception
-    except:
-        print("Could not get files")
-        return
+
+def _init_worker(threads):
+    #keep every job inside its share of the cores instead of each grabbing all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    #the splitter's configure_cpu_threads() reads this when it loads a model, so a SONG_DEMUCS_THREADS
+    #inherited from the shell must not override the per-job budget
+    os.environ["SONG_DEMUCS_THREADS"] = str(threads)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def _split_one(path, method):
+    """Runs inside a worker process, which keeps its separation model warm between jobs."""
+    return asyncio.run(split(path, method))
+
+
+def _split_many(paths, method, windows_per_batch=None):
+    """
+    Runs inside a worker process; splits paths together, windows_per_batch windows per model call
+    (default: the preset's batch size).
+    """
+    return asyncio.run(demucs_split_many(paths, preset=method, batch_size=windows_per_batch))
+
+
+async def split_all(directory, method="demucs", workers=None, threads_per_job=None, songs_per_batch=1,
+                    windows_per_batch=None):
+    print("Getting files")
+    #raises before a manifest is created for a bad path
+    filenames = get_files(directory)
     print("Valid files!")
 
+    manifest = JobManifest(directory, method)
 
+    #cache hits and finished jobs never reach the pool
+    pending = []
     for item in filenames:
-        print(f"Running split operation on {item}")
-        await demucs_split(os.path.join(directory, item))
-        print(f"{item} finished!\n")
+        if os.path.splitext(item)[1].lower() not in AUDIO_EXTENSIONS:
+            continue
+        if manifest.state(item) == "failed" and manifest.attempts(item) >= MAX_ATTEMPTS:
+            print(f"{item} failed {MAX_ATTEMPTS} times before, skipping")
+            continue
+        try:
+            path = convert_audio(os.path.join(directory, item))
+        except Exception as e:
+            #may be transient (a locked or half-copied file), so it is queued and run() converts it
+            #again, counting each failure as one attempt with backoff like a failed split
+            print(f"{item} could not be read yet: {e}")
+            manifest.set(item, "queued", error=str(e))
+            pending.append((item, None))
+            continue
+        if find_cached_split(path, method) is not None:
+            if manifest.state(item) != "done":
+                manifest.set(item, "done", input=path)
+            print(f"{item} already split, skipping")
+            continue
+        #anything left "running" was interrupted and is simply queued again
+        manifest.set(item, "queued", input=path)
+        pending.append((item, path))
+    if not pending:
+        return
+
+    #a group of songs is one job; only Demucs presets can share model calls
+    if songs_per_batch > 1 and get_preset(method)["backend"] == "demucs":
+        #songs that could not be read yet run on their own, so they cannot fail a whole group
+        readable = [job for job in pending if job[1] is not None]
+        groups = [readable[i:i + songs_per_batch] for i in range(0, len(readable), songs_per_batch)]
+        groups += [[job] for job in pending if job[1] is None]
+    else:
+        groups = [[job] for job in pending]
+
+    if workers is None:
+        workers = default_workers()
+    workers = min(workers, len(groups))
+    if threads_per_job is None:
+        threads_per_job = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Splitting {len(pending)} files on {workers} workers x {threads_per_job} threads")
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(threads_per_job,)) as pool:
+        def prepare(item):
+            #a split elsewhere in the run may have pruned this queued input from the cache;
+            #converting again restores it if so and marks it as just used
+            return convert_audio(os.path.join(directory, item))
+
+        async def run(item, path):
+            while True:
+                print(f"Running split operation on {item}")
+                manifest.set(item, "running")
+                try:
+                    path = prepare(item)
+                    await loop.run_in_executor(pool, _split_one, path, method)
+                except Exception as e:
+                    attempts = manifest.attempts(item) + 1
+                    manifest.set(item, "failed", error=str(e), attempts=attempts)
+                    print(f"{item} failed (attempt {attempts}): {e}\n")
+                    if attempts >= MAX_ATTEMPTS:
+                        return
+                    await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempts - 1))
+                    continue
+                manifest.set(item, "done", error=None, finished=time.time())
+                print(f"{item} finished!\n")
+                return
+
+        async def run_group(group):
+            if len(group) == 1:
+                await run(*group[0])
+                return
+            items = [item for item, _ in group]
+            print(f"Running split operation on {', '.join(items)}")
+            for item in items:
+                manifest.set(item, "running")
+            try:
+                paths = [prepare(item) for item in items]
+                await loop.run_in_executor(pool, _split_many, paths, method, windows_per_batch)
+            except Exception as e:
+                #one bad song fails the whole group, so retry them one by one
+                print(f"Batch failed, retrying its songs separately: {e}\n")
+                await asyncio.gather(*(run(item, path) for item, path in group))
+                return
+            for item in items:
+                manifest.set(item, "done", error=None, finished=time.time())
+                print(f"{item} finished!\n")
+
+        await asyncio.gather(*(run_group(group) for group in groups))
 
 
 async def main():
-    directory = "C:/Users/Atlas/Music/Splitter Project/"
+    parser = argparse.ArgumentParser(description="Split every song in a folder into stems.")
+    parser.add_argument("directory", help="folder with the songs to split")
+    parser.add_argument("--method", "--backend", "--preset", choices=get_split_presets(), default="demucs")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="songs split at the same time (default: one per four cores)")
+    parser.add_argument("--threads-per-job", type=int, default=None,
+                        help="torch threads per song (default: cores / workers)")
+    parser.add_argument("--songs-per-batch", type=int, default=1,
+                        help="songs split together in one Demucs job, for backlogs of short tracks")
+    parser.add_argument("--windows-per-batch", type=int, default=None,
+                        help="windows per Demucs model call when songs are split together "
+                             "(default: the preset's batch size)")
+    args = parser.parse_args()
+
     print("Starting split")
-    await split_all(directory)
+    try:
+        await split_all(args.directory, args.method, args.workers, args.threads_per_job, args.songs_per_batch,
+                        args.windows_per_batch)
+    except OSError as e:
+        print(f"Could not get files: {e}", file=sys.stderr)
+        return 1
     print("")
     print("Split done!")
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
@@ -1,102 +1,781 @@
 import asyncio
+import functools
 import os
+import queue
 import subprocess
-from pydub import AudioSegment
+import threading
+from contextlib import contextmanager
 
+import numpy as np
 import torch
 from demucs import pretrained
 from demucs.apply import apply_model
+from demucs.audio import convert_audio as demucs_convert_audio
+import soundfile as sf
 import torchaudio
 from spleeter.separator import Separator
 
-from utils import cache_file, get_cache_dir
+from audio_buffer import NATIVE_EXT, in_cache, write_native
+from cache_index import get_index, remove_path
+from utils import cache_file, cached_input_path, get_cache_dir
 #splitter.py
+
+#Formats both Demucs (torchaudio) and Spleeter (ffmpeg) read as is, so they are never converted
+DIRECT_FORMATS = {".mp3", ".wav", ".flac"}
+#Frames decoded and encoded per step when converting
+CONVERT_BLOCK = 1 << 16
+#ffmpeg output for formats soundfile cannot read; both separators work at 44.1 kHz stereo
+CONVERT_SAMPLE_RATE = 44100
+CONVERT_CHANNELS = 2
+
+
+def _convert_soundfile(file_path: str, out_path: str, format: str = 'WAV'):
+    """Decode with soundfile and encode to 16-bit WAV (or format), CONVERT_BLOCK frames at a time."""
+    with sf.SoundFile(file_path) as src, \
+            sf.SoundFile(out_path, 'w', samplerate=src.samplerate, channels=src.channels,
+                         format=format, subtype='PCM_16') as dst:
+        for block in src.blocks(blocksize=CONVERT_BLOCK, dtype='float32', always_2d=True):
+            dst.write(block)
+
+
+def _convert_ffmpeg(file_path: str, out_path: str):
+    """Pipe raw float samples out of ffmpeg and encode them to 16-bit WAV as they arrive."""
+    cmd = ["ffmpeg", "-v", "error", "-nostdin", "-i", file_path,
+           "-f", "f32le", "-acodec", "pcm_f32le",
+           "-ac", str(CONVERT_CHANNELS), "-ar", str(CONVERT_SAMPLE_RATE), "-"]
+    frame_bytes = 4 * CONVERT_CHANNELS
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc, \
+            sf.SoundFile(out_path, 'w', samplerate=CONVERT_SAMPLE_RATE, channels=CONVERT_CHANNELS,
+                         format='WAV', subtype='PCM_16') as dst:
+        pending = b""
+        for chunk in iter(lambda: proc.stdout.read(CONVERT_BLOCK * frame_bytes), b""):
+            chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % frame_bytes
+            pending = chunk[usable:]
+            block = np.frombuffer(chunk[:usable], dtype=np.float32)
+            dst.write(block.reshape(-1, CONVERT_CHANNELS))
+        error = proc.stderr.read().decode(errors="replace").strip()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not convert {file_path}: {error}")
+
+
 def convert_audio(file_path: str) -> str:
-    """Checks if a file is a .wav or .mp3, the only supported file formats from Demucs and Spleeter"""
-    SUPPORTED_FORMATS = {".mp3", ".wav"}
+    """
+    Return a cached copy of file_path that Demucs and Spleeter can read.
+    mp3, wav and flac are linked into the cache untouched; anything else is streamed to a WAV,
+    through soundfile when libsndfile reads the format and through an ffmpeg pipe otherwise,
+    so the song is never decoded into memory as a whole.
+    Cached inputs are named after their content hash, so split output folders are keyed on content, not file name.
+    """
     ext = os.path.splitext(file_path)[1].lower()
-    if ext in SUPPORTED_FORMATS:
-        return cache_file(file_path)
+    if ext in DIRECT_FORMATS:
+        cached_file = cache_file(file_path)
     else:
-        cache_dir = get_cache_dir()
         #cache converted file
-        cached_file = os.path.join(cache_dir, os.path.splitext(os.path.basename(file_path))[0] + ".wav")
+        cached_file = cached_input_path(file_path, ".wav")
         if not os.path.exists(cached_file):
             print(f"Converting {file_path} to WAV format...")
-            audio = AudioSegment.from_file(file_path)
-            audio.export(cached_file, format="wav")
-        return cached_file
+            tmp = cached_file + ".partial"
+            try:
+                try:
+                    sf.info(file_path)
+                except RuntimeError:
+                    _convert_ffmpeg(file_path, tmp)
+                else:
+                    _convert_soundfile(file_path, tmp)
+                os.replace(tmp, cached_file)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+    index = get_index()
+    if index.lookup(cached_file) is None:
+        index.record(cached_file, "input")
+    return cached_file
 
 
-async def spleeter_split(file_path: str, output_dir: str = None) -> tuple:
-    """Splits a song into stems using Spleeter and caches the result."""
-    from utils import get_cache_dir
-    if output_dir is None:
-        output_dir = os.path.join(get_cache_dir(), "Spleeter_Output")
-    os.makedirs(output_dir, exist_ok=True)
+#How split stems are stored: "wav" as the separators write them, "flac" to save disk space,
+#"npy" as float32 that is memory-mapped on load without decoding.
+#Override with the SONG_STEM_FORMAT environment variable.
+STEM_FORMATS = {"wav": ".wav", "flac": ".flac", "npy": NATIVE_EXT}
+DEFAULT_STEM_FORMAT = "wav"
+
+
+def get_stem_format() -> str:
+    fmt = os.environ.get("SONG_STEM_FORMAT", DEFAULT_STEM_FORMAT).lower()
+    if fmt not in STEM_FORMATS:
+        raise ValueError(f"Unknown stem format: {fmt} (expected one of {', '.join(STEM_FORMATS)})")
+    return fmt
+
+
+def stem_paths(track_folder: str, stem_files: tuple, fmt: str) -> tuple:
+    """Paths of the stems in track_folder when stored as fmt."""
+    ext = STEM_FORMATS[fmt]
+    return tuple(os.path.join(track_folder, os.path.splitext(s)[0] + ext) for s in stem_files)
+
+
+def store_stems(track_folder: str, stem_files: tuple, fmt: str) -> tuple:
+    """Convert the separator's WAV stems in track_folder to fmt, replacing them. Returns the new paths."""
+    wavs = stem_paths(track_folder, stem_files, "wav")
+    stems = stem_paths(track_folder, stem_files, fmt)
+    if fmt == "wav":
+        return stems
+    for wav, stem in zip(wavs, stems):
+        if fmt == "npy":
+            write_native(wav, stem)
+        else:
+            _convert_soundfile(wav, stem, format='FLAC')
+        os.remove(wav)
+    return stems
+
+
+def cached_stems(track_folder: str, stem_files: tuple, backend: str):
+    """
+    Return the stem paths if track_folder is a finished split in the cache index, else None.
+    Splits stored in any format are used, in the format the index recorded for them.
+    Folders outside the cache are not indexed and are only checked on disk.
+    """
+    indexed = in_cache(track_folder)
+    if indexed:
+        index = get_index()
+        entry = index.lookup(track_folder)
+        if entry is not None:
+            #splits indexed before formats were recorded are WAV
+            return stem_paths(track_folder, stem_files, entry[2] or "wav")
+    #splits made before the index existed are picked up once, preferring the configured format
+    if not os.path.isdir(track_folder):
+        return None
+    fmt = get_stem_format()
+    for candidate in [fmt] + [f for f in STEM_FORMATS if f != fmt]:
+        stems = stem_paths(track_folder, stem_files, candidate)
+        if all(os.path.exists(s) for s in stems):
+            if indexed:
+                index.record(track_folder, backend, fmt=candidate)
+            return stems
+    return None
+
+
+def partial_folder(track_folder: str) -> str:
+    """
+    Scratch folder a split is written to before it is published under track_folder.
+    Anything left there is from an interrupted split and is thrown away.
+    """
+    partial = track_folder + ".partial"
+    remove_path(partial)
+    return partial
+
+
+def publish_split(partial: str, track_folder: str):
+    """Move a finished split into place with a rename, so track_folder is never half-written."""
+    #only incomplete leftovers can be here, since the cache check came first
+    remove_path(track_folder)
+    os.replace(partial, track_folder)
+
+
+def record_split(track_folder: str, backend: str, input_path: str, fmt: str):
+    """Index a new split, stored as fmt, and evict old entries if the cache is over budget."""
+    #a caller's own output_dir is not the cache's to size or evict
+    if not in_cache(track_folder):
+        return
+    index = get_index()
+    index.record(track_folder, backend, fmt=fmt)
+    index.prune(keep=(track_folder, input_path))
+
+
+#Same defaults as the demucs command line
+DEMUCS_MODEL = "htdemucs"
+DEMUCS_SHIFTS = 1
+DEMUCS_OVERLAP = 0.25
+#The song is separated in windows this long (crossfaded over the overlap), for progress and cancellation
+DEMUCS_WINDOW_SECONDS = 30
+DEMUCS_WINDOW_OVERLAP_SECONDS = 1
+#Windows passed to the model together; larger batches keep more CPU cores busy per call
+DEMUCS_BATCH_SIZE = 1
+#Windows per model call when several songs are split together
+DEMUCS_MULTI_BATCH_SIZE = 4
+
+
+class SplitCancelled(Exception):
+    """Raised when a split is aborted through its cancel event."""
+
+
+def segment_bounds(length: int, window: int, overlap: int) -> list:
+    """(start, stop) windows covering length samples, consecutive windows sharing overlap samples."""
+    bounds = []
+    start = 0
+    while True:
+        stop = min(start + window, length)
+        bounds.append((start, stop))
+        if stop >= length:
+            return bounds
+        start = stop - overlap
+
+
+def fade_weights(n: int, overlap: int, fade_in: bool, fade_out: bool):
+    """Linear crossfade weights for a window; overlapping ramps sum to one."""
+    weights = torch.ones(n)
+    ramp = torch.linspace(0, 1, overlap + 2)[1:-1]
+    if fade_in:
+        weights[:overlap] = ramp
+    if fade_out:
+        weights[-overlap:] = ramp.flip(0)
+    return weights
+
+
+def configure_cpu_threads():
+    """
+    Thread settings for CPU inference. SONG_DEMUCS_THREADS sets torch's intra-op threads
+    (torch defaults to one per physical core); inter-op parallelism is turned off, since
+    Demucs runs its layers one after another and extra pools only oversubscribe the cores.
+    """
+    threads = os.environ.get("SONG_DEMUCS_THREADS")
+    if threads:
+        torch.set_num_threads(int(threads))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        #already set for this process, e.g. by split_all's worker initializer
+        pass
+
+
+def window_batches(bounds: list, batch_size: int) -> list:
+    """
+    Group consecutive windows into batches of at most batch_size.
+    Windows in a batch have to be the same length, so a shorter last window runs on its own.
+    """
+    full = bounds[0][1] - bounds[0][0]
+    batches = []
+    for start, stop in bounds:
+        if batches and len(batches[-1]) < batch_size and stop - start == full:
+            batches[-1].append((start, stop))
+        else:
+            batches.append([(start, stop)])
+    return batches
+
+
+class StemWriter:
+    """
+    Writes one song's separated windows to <source>.wav files in out_folder.
+    Consecutive windows are crossfaded over window_overlap samples; the faded-out end of a window
+    is carried until the next one arrives, so windows have to be written in order.
+    """
+
+    def __init__(self, out_folder, model, channels, length, mean, std, window_overlap):
+        os.makedirs(out_folder, exist_ok=True)
+        self.paths = tuple(os.path.join(out_folder, name + ".wav") for name in model.sources)
+        self.length = length
+        self.mean = mean
+        self.std = std
+        self.window_overlap = window_overlap
+        self.carry = None
+        self.writers = [sf.SoundFile(path, 'w', samplerate=model.samplerate, channels=channels,
+                                     subtype='PCM_16') for path in self.paths]
+
+    def write(self, est, start, stop):
+        """Add the window's (sources, channels, n) estimate and write its finished region, which is returned."""
+        length = self.length
+        overlap = self.window_overlap
+        #the crossfade ramps sum to one, so adding the windows is enough
+        est = est * fade_weights(stop - start, overlap, start > 0, stop < length)
+        if self.carry is not None:
+            est[..., :overlap] += self.carry
+        done = stop if stop >= length else stop - overlap
+        self.carry = est[..., done - start:].clone() if stop < length else None
+
+        region = (est[..., :done - start] * self.std + self.mean).clamp(-1, 1).numpy()
+        for writer, source in zip(self.writers, region):
+            writer.write(source.T)
+            writer.flush()
+        return region
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+class DemucsEngine:
+    """
+    In-process Demucs separation. The model is loaded once and kept warm,
+    so every split after the first only pays for inference.
+    With quantize, Linear and LSTM layers are converted to dynamic int8 on CPU,
+    trading a little quality for speed.
+    """
+
+    def __init__(self, model_name: str = DEMUCS_MODEL, device: str = None, quantize: bool = False):
+        self.model_name = model_name
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        #dynamic quantization only has CPU kernels
+        self.quantize = quantize and self.device == "cpu"
+        self.model = None
+        #one separation at a time per model
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.model is None:
+            if self.device == "cpu":
+                configure_cpu_threads()
+            model = pretrained.get_model(self.model_name)
+            model.to(self.device)
+            model.eval()
+            if self.quantize:
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+            self.model = model
+        return self.model
+
+    def _load_song(self, file_path: str):
+        """Read a song at the model's rate and channel count, normalised like demucs.separate. Returns (wav, mean, std)."""
+        model = self.model
+        wav, sr = torchaudio.load(file_path)
+        wav = demucs_convert_audio(wav, sr, model.samplerate, model.audio_channels)
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std()
+        return (wav - mean) / std, mean, std
+
+    def _apply(self, windows: list, shifts: int, overlap: float) -> list:
+        """
+        Run a list of (channels, n) windows through the model as one batch.
+        Shorter windows are zero-padded to the longest, like Demucs pads its own segments,
+        and their estimates are cropped back.
+        """
+        longest = max(w.shape[-1] for w in windows)
+        mix = torch.stack([torch.nn.functional.pad(w, (0, longest - w.shape[-1])) for w in windows])
+        estimates = apply_model(self.model, mix, device=self.device, shifts=shifts,
+                                split=True, overlap=overlap, progress=False).cpu()
+        return [est[..., :w.shape[-1]] for w, est in zip(windows, estimates)]
+
+    def separate(self, file_path: str, out_folder: str, progress=None, cancel_event=None,
+                 on_segment=None, shifts: int = DEMUCS_SHIFTS, overlap: float = DEMUCS_OVERLAP,
+                 batch_size: int = DEMUCS_BATCH_SIZE) -> tuple:
+        """
+        Split file_path and write one <source>.wav per model source into out_folder, like the CLI does.
+        The song is processed in overlapping windows and each finished region is appended to the stem
+        files straight away, so only one batch of windows is held in memory. Samples are clamped
+        rather than rescaled, since the whole stem is never in memory at once.
+
+        progress(done, total) is called after each window, on_segment(start, {source: (channels, n)
+        float32 array}, sample_rate, total_frames) hands out each finished region for early playback,
+        and setting cancel_event aborts with SplitCancelled at the next window.
+        shifts and overlap are passed on to demucs' apply_model; up to batch_size full windows
+        go through the model in one call.
+        """
+        with self._lock:
+            model = self.load()
+            wav, mean, std = self._load_song(file_path)
+            length = wav.shape[-1]
+            window_overlap = int(DEMUCS_WINDOW_OVERLAP_SECONDS * model.samplerate)
+            bounds = segment_bounds(length, int(DEMUCS_WINDOW_SECONDS * model.samplerate), window_overlap)
+
+            stems = StemWriter(out_folder, model, wav.shape[0], length, mean, std, window_overlap)
+            try:
+                if progress is not None:
+                    progress(0, len(bounds))
+                done_windows = 0
+                for batch in window_batches(bounds, batch_size):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise SplitCancelled()
+                    with torch.inference_mode():
+                        estimates = self._apply([wav[:, start:stop] for start, stop in batch], shifts, overlap)
+                        for (start, stop), est in zip(batch, estimates):
+                            region = stems.write(est, start, stop)
+                            if on_segment is not None:
+                                on_segment(start, dict(zip(model.sources, region)), model.samplerate, length)
+                            done_windows += 1
+                            if progress is not None:
+                                progress(done_windows, len(bounds))
+            finally:
+                stems.close()
+            return stems.paths
+
+    def separate_many(self, jobs: list, progress=None, cancel_event=None, shifts: int = DEMUCS_SHIFTS,
+                      overlap: float = DEMUCS_OVERLAP, batch_size: int = DEMUCS_MULTI_BATCH_SIZE) -> list:
+        """
+        Split several songs, given as (file_path, out_folder) pairs, packing windows from different
+        songs into the same model call, so short songs still fill a batch.
+        Every song is read up front; stems are written per song exactly as separate() writes them.
+        progress(done, total) counts windows over all songs. Returns the stem paths per job.
+        """
+        with self._lock:
+            model = self.load()
+            window_samples = int(DEMUCS_WINDOW_SECONDS * model.samplerate)
+            window_overlap = int(DEMUCS_WINDOW_OVERLAP_SECONDS * model.samplerate)
+            songs = []
+            writers = []
+            try:
+                #song by song, so each song's windows still arrive in order
+                windows = []
+                for file_path, out_folder in jobs:
+                    wav, mean, std = self._load_song(file_path)
+                    length = wav.shape[-1]
+                    writers.append(StemWriter(out_folder, model, wav.shape[0], length, mean, std, window_overlap))
+                    windows.extend((len(songs), start, stop)
+                                   for start, stop in segment_bounds(length, window_samples, window_overlap))
+                    songs.append(wav)
 
+                if progress is not None:
+                    progress(0, len(windows))
+                for first in range(0, len(windows), batch_size):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise SplitCancelled()
+                    batch = windows[first:first + batch_size]
+                    with torch.inference_mode():
+                        estimates = self._apply([songs[i][:, start:stop] for i, start, stop in batch],
+                                                shifts, overlap)
+                        for (i, start, stop), est in zip(batch, estimates):
+                            writers[i].write(est, start, stop)
+                    if progress is not None:
+                        progress(first + len(batch), len(windows))
+            finally:
+                for stems in writers:
+                    stems.close()
+            return [stems.paths for stems in writers]
+
+
+_demucs_engines = {}
+_demucs_engines_lock = threading.Lock()
+
+
+def get_demucs_engine(model_name: str = DEMUCS_MODEL, quantize: bool = False) -> DemucsEngine:
+    """Process-wide engine per model (and quantization), created on first use."""
+    key = (model_name, quantize)
+    with _demucs_engines_lock:
+        if key not in _demucs_engines:
+            _demucs_engines[key] = DemucsEngine(model_name, quantize=quantize)
+        return _demucs_engines[key]
+
+
+SPLEETER_MODEL = "spleeter:4stems"
+#Separators kept alive per process; each one holds its own TensorFlow graph
+SPLEETER_POOL_SIZE = 1
+
+
+class SeparatorPool:
+    """
+    Long-lived Spleeter separators, created on first use and reused across calls.
+    Each separator is handed to one caller at a time; extra callers wait for one to free up.
+    """
+
+    def __init__(self, params: str = SPLEETER_MODEL, size: int = SPLEETER_POOL_SIZE):
+        self.params = params
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def separator(self):
+        try:
+            sep = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    sep = Separator(self.params)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                sep = self._idle.get()
+        try:
+            yield sep
+        finally:
+            self._idle.put(sep)
+
+
+_spleeter_pools = {}
+_spleeter_pools_lock = threading.Lock()
+
+
+def get_spleeter_pool(params: str = SPLEETER_MODEL) -> SeparatorPool:
+    """Process-wide pool per Spleeter configuration, created on first use."""
+    with _spleeter_pools_lock:
+        if params not in _spleeter_pools:
+            _spleeter_pools[params] = SeparatorPool(params)
+        return _spleeter_pools[params]
+
+
+def _spleeter_separate(file_path: str, output_dir: str, cancel_event=None, params: str = SPLEETER_MODEL):
+    with get_spleeter_pool(params).separator() as separator:
+        #spleeter runs as one call, so a cancel can only be honoured before it starts
+        if cancel_event is not None and cancel_event.is_set():
+            raise SplitCancelled()
+        separator.separate_to_file(file_path, output_dir)
+
+
+SPLEETER_STEMS = ("vocals.wav", "drums.wav", "bass.wav", "other.wav")
+DEMUCS_STEMS = ("bass.wav", "drums.wav", "other.wav", "vocals.wav")
+DEMUCS_6_STEMS = ("bass.wav", "drums.wav", "guitar.wav", "other.wav", "piano.wav", "vocals.wav")
+
+# Define available split presets and their separation settings.
+# "output" is the folder in the cache and "subfolder" the preset's own folder inside it,
+# so splits made with different presets never share a cache entry.
+SPLIT_PRESETS = {
+    "demucs": {
+        "backend": "demucs",
+        "model": DEMUCS_MODEL,
+        "shifts": DEMUCS_SHIFTS,
+        "overlap": DEMUCS_OVERLAP,
+        "output": "Demucs_Output",
+        "subfolder": "htdemucs",
+        "stems": DEMUCS_STEMS
+    },
+    "spleeter": {
+        "backend": "spleeter",
+        "model": SPLEETER_MODEL,
+        "output": "Spleeter_Output",
+        "subfolder": "",
+        "stems": SPLEETER_STEMS
+    },
+    #Spleeter separates several times faster than any htdemucs setting; same settings and folder as
+    #"spleeter", so the two share their cached splits
+    "fast": {
+        "backend": "spleeter",
+        "model": SPLEETER_MODEL,
+        "output": "Spleeter_Output",
+        "subfolder": "",
+        "stems": SPLEETER_STEMS
+    },
+    "quality": {
+        "backend": "demucs",
+        "model": DEMUCS_MODEL,
+        "shifts": 5,
+        "overlap": 0.5,
+        "output": "Demucs_Output",
+        "subfolder": "htdemucs_quality",
+        "stems": DEMUCS_STEMS
+    },
+    "6stems": {
+        "backend": "demucs",
+        "model": "htdemucs_6s",
+        "shifts": DEMUCS_SHIFTS,
+        "overlap": DEMUCS_OVERLAP,
+        "output": "Demucs_Output",
+        "subfolder": "htdemucs_6s",
+        "stems": DEMUCS_6_STEMS
+    },
+    #for machines without a GPU: int8 Linear/LSTM layers and several windows per model call
+    "cpu": {
+        "backend": "demucs",
+        "model": DEMUCS_MODEL,
+        "shifts": 0,
+        "overlap": 0.1,
+        "quantize": True,
+        "batch_size": 4,
+        "output": "Demucs_Output",
+        "subfolder": "htdemucs_cpu_q8",
+        "stems": DEMUCS_STEMS
+    }
+}
+
+
+def get_split_presets() -> list:
+    """
+    Return a list of preset names for populating UI dropdowns and command line choices.
+    """
+    return list(SPLIT_PRESETS.keys())
+
+
+def get_preset(preset: str) -> dict:
+    """Settings of a split preset; raises ValueError for unknown names."""
+    try:
+        return SPLIT_PRESETS[preset]
+    except KeyError:
+        raise ValueError(f"Unknown separation method: {preset}") from None
+
+
+def split_location(file_path: str, preset: str, output_dir: str = None) -> tuple:
+    """Return (output_dir, stem folder, stem file names) for splitting file_path with preset."""
+    settings = get_preset(preset)
     base_name = os.path.splitext(os.path.basename(file_path))[0]
-    track_folder = os.path.join(output_dir, base_name)
-    expected_tracks = ("vocals.wav", "drums.wav", "bass.wav", "other.wav")
+    if output_dir is None:
+        output_dir = os.path.join(get_cache_dir(), settings["output"])
+    return output_dir, os.path.join(output_dir, settings["subfolder"], base_name), settings["stems"]
+
+
+def find_cached_split(file_path: str, preset: str, output_dir: str = None):
+    """Stem paths of an earlier split of file_path, or None if it still has to be split."""
+    _, folder, stem_files = split_location(file_path, preset, output_dir)
+    return cached_stems(folder, stem_files, preset)
+
+
+async def spleeter_split(file_path: str, output_dir: str = None, progress=None, cancel_event=None,
+                         on_segment=None, preset: str = "spleeter") -> tuple:
+    """
+    Splits a song into stems using Spleeter and caches the result.
+    Spleeter reports no intermediate progress and writes the stems in one call, so on_segment is never called;
+    a cancel during separation discards its output.
+    """
+    output_dir, track_folder, expected_tracks = split_location(file_path, preset, output_dir)
+    os.makedirs(output_dir, exist_ok=True)
 
     #check cache
-    if os.path.isdir(track_folder) and all(os.path.exists(os.path.join(track_folder, t)) for t in expected_tracks):
+    stems = cached_stems(track_folder, expected_tracks, preset)
+    if stems is not None:
         print(f"Cache hit: Using previously split files from {track_folder}")
-        return tuple(os.path.join(track_folder, t) for t in expected_tracks)
+        return stems
 
     #cache miss; split now
     print("Cache miss: Running Spleeter splitting process...")
-    separator = Separator("spleeter:4stems")
+    partial = partial_folder(track_folder)
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, separator.separate_to_file, file_path, output_dir)
+    if progress is not None:
+        progress(0, 1)
+    #spleeter writes <output>/<name>/, so give it the scratch folder as output
+    try:
+        await loop.run_in_executor(None, _spleeter_separate, file_path, partial, cancel_event,
+                                   get_preset(preset)["model"])
+    except Exception:
+        remove_path(partial)
+        raise
+    if cancel_event is not None and cancel_event.is_set():
+        remove_path(partial)
+        raise SplitCancelled()
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    fmt = get_stem_format()
+    try:
+        store_stems(os.path.join(partial, base_name), expected_tracks, fmt)
+    except Exception:
+        remove_path(partial)
+        raise
+    if progress is not None:
+        progress(1, 1)
+    publish_split(os.path.join(partial, base_name), track_folder)
+    remove_path(partial)
+    record_split(track_folder, preset, file_path, fmt)
 
-    return tuple(os.path.join(track_folder, t) for t in expected_tracks)
+    return stem_paths(track_folder, expected_tracks, fmt)
 
 
-async def demucs_split(file_path: str, output_dir: str = None) -> tuple:
-    """Splits a song into stems using Demucs and caches the result."""
-    if output_dir is None:
-        output_dir = os.path.join(get_cache_dir(), "Demucs_Output")
+async def demucs_split(file_path: str, output_dir: str = None, progress=None, cancel_event=None,
+                       on_segment=None, preset: str = "demucs") -> tuple:
+    """
+    Splits a song into stems using Demucs and caches the result.
+    progress(done, total) reports finished windows; cancel_event aborts the split and removes partial output;
+    on_segment receives each finished stem region so playback can start before the split is done.
+    """
+    output_dir, song_output_folder, stem_files = split_location(file_path, preset, output_dir)
     os.makedirs(output_dir, exist_ok=True)
 
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    song_output_folder = os.path.join(output_dir, "htdemucs", base_name)
-    stem_files = ("bass.wav", "drums.wav", "other.wav", "vocals.wav")
-
     #check cache
-    if os.path.isdir(song_output_folder) and all(
-            os.path.exists(os.path.join(song_output_folder, s)) for s in stem_files):
+    stems = cached_stems(song_output_folder, stem_files, preset)
+    if stems is not None:
         print(f"Cache hit: Using previously split files from {song_output_folder}")
-        return tuple(os.path.join(song_output_folder, s) for s in stem_files)
+        return stems
 
-    #cache miss; split now
+    #cache miss; split now with the warm in-process model
     print("Cache miss: Running Demucs splitting process...")
-    process = await asyncio.create_subprocess_exec(
-        "demucs", "--out", output_dir, file_path,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    if process.returncode != 0:
-        raise RuntimeError(f"Demucs failed:\n{stderr.decode()}")
+    settings = get_preset(preset)
+    engine = get_demucs_engine(settings["model"], settings.get("quantize", False))
+    partial = partial_folder(song_output_folder)
+    fmt = get_stem_format()
+    loop = asyncio.get_event_loop()
+    try:
+        await loop.run_in_executor(None, functools.partial(engine.separate, file_path, partial,
+                                                           progress=progress, cancel_event=cancel_event,
+                                                           on_segment=on_segment, shifts=settings["shifts"],
+                                                           overlap=settings["overlap"],
+                                                           batch_size=settings.get("batch_size", DEMUCS_BATCH_SIZE)))
+        await loop.run_in_executor(None, store_stems, partial, stem_files, fmt)
+    except SplitCancelled:
+        remove_path(partial)
+        raise
+    except Exception as e:
+        remove_path(partial)
+        raise RuntimeError(f"Demucs failed:\n{e}") from e
+    publish_split(partial, song_output_folder)
+    record_split(song_output_folder, preset, file_path, fmt)
 
     # Return the new expected path
-    return tuple(os.path.join(song_output_folder, s) for s in stem_files)
+    return stem_paths(song_output_folder, stem_files, fmt)
+
+
+async def demucs_split_many(file_paths: list, output_dir: str = None, preset: str = "demucs",
+                            batch_size: int = None, progress=None, cancel_event=None) -> list:
+    """
+    Split several songs with one Demucs preset, packing windows from all of them into shared model calls.
+    batch_size is windows per model call; by default the preset's own batch_size, or DEMUCS_MULTI_BATCH_SIZE.
+    Each song keeps its own cache entry: cached songs are returned straight away, and every new split
+    is published and recorded on its own, exactly as demucs_split would. Returns the stem paths per song.
+    """
+    settings = get_preset(preset)
+    if settings["backend"] != "demucs":
+        raise ValueError(f"{preset} is not a Demucs preset")
+    if batch_size is None:
+        batch_size = settings.get("batch_size", DEMUCS_MULTI_BATCH_SIZE)
+    results = [None] * len(file_paths)
+    #stem folder -> (file path, stem file names, indexes of the songs that map to it)
+    pending = {}
+    for i, file_path in enumerate(file_paths):
+        folder_root, folder, stem_files = split_location(file_path, preset, output_dir)
+        os.makedirs(folder_root, exist_ok=True)
+        stems = cached_stems(folder, stem_files, preset)
+        if stems is not None:
+            print(f"Cache hit: Using previously split files from {folder}")
+            results[i] = stems
+        elif folder in pending:
+            #identical content, so the same split serves both
+            pending[folder][2].append(i)
+        else:
+            pending[folder] = (file_path, stem_files, [i])
+    if not pending:
+        return results
+
+    print(f"Cache miss: Running Demucs on {len(pending)} songs together...")
+    engine = get_demucs_engine(settings["model"], settings.get("quantize", False))
+    fmt = get_stem_format()
+    partials = {folder: partial_folder(folder) for folder in pending}
+    jobs = [(file_path, partials[folder]) for folder, (file_path, _, _) in pending.items()]
+    loop = asyncio.get_event_loop()
+    try:
+        await loop.run_in_executor(None, functools.partial(engine.separate_many, jobs, progress=progress,
+                                                           cancel_event=cancel_event, shifts=settings["shifts"],
+                                                           overlap=settings["overlap"], batch_size=batch_size))
+        for folder, (_, stem_files, _) in pending.items():
+            await loop.run_in_executor(None, store_stems, partials[folder], stem_files, fmt)
+    except SplitCancelled:
+        for partial in partials.values():
+            remove_path(partial)
+        raise
+    except Exception as e:
+        for partial in partials.values():
+            remove_path(partial)
+        raise RuntimeError(f"Demucs failed:\n{e}") from e
+
+    for folder, (file_path, stem_files, indexes) in pending.items():
+        publish_split(partials[folder], folder)
+        record_split(folder, preset, file_path, fmt)
+        for i in indexes:
+            results[i] = stem_paths(folder, stem_files, fmt)
+    return results
+
+
+SPLIT_BACKENDS = {
+    "demucs": demucs_split,
+    "spleeter": spleeter_split
+}
+
+
+async def split(file_path: str, preset: str = "demucs", output_dir: str = None, progress=None,
+                cancel_event=None, on_segment=None) -> tuple:
+    """Split file_path with a preset from SPLIT_PRESETS, through the backend it names."""
+    split_backend = SPLIT_BACKENDS[get_preset(preset)["backend"]]
+    return await split_backend(file_path, output_dir, progress=progress, cancel_event=cancel_event,
+                               on_segment=on_segment, preset=preset)
 
 # JUST FOR DEBUGGING BELOW
 async def main():
     file_path = input("Enter the path to the audio file: ").strip()
-    method = input("Choose separation method (spleeter/demucs): ").strip().lower()
+    method = input(f"Choose separation method ({'/'.join(get_split_presets())}): ").strip().lower()
+    if method not in SPLIT_PRESETS:
+        print("Invalid method chosen.")
+        return
 
     converted_file = convert_audio(file_path)
     print("File ready")
-    if method == "spleeter":
-        stems = await spleeter_split(converted_file)
-    elif method == "demucs":
-        stems = await demucs_split(converted_file)
-    else:
-        print("Invalid method chosen.")
-        return
+    stems = await split(converted_file, method)
 
     print("Separated stem files:")
     for path in stems:
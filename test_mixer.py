@@ -0,0 +1,95 @@
+import sys
+import tracemalloc
+import types
+
+import numpy as np
+
+#the callback is driven directly, so no audio device (or PortAudio) is needed
+sys.modules.setdefault("sounddevice", types.ModuleType("sounddevice"))
+
+from audio_buffer import AudioBuffer  # noqa: E402
+from mixer import BLOCK_SIZE, Mixer  # noqa: E402
+
+CALLBACKS = 300
+#room for the short-lived slice views the callback creates, but half of a single
+#channel's float32 block, so any sample array allocated per callback shows up
+MAX_ALLOCATED_BYTES = BLOCK_SIZE * 2
+
+
+class FakeTrack:
+    def __init__(self, data, gain=0.5, muted=False, soloed=False):
+        self.audio_data = AudioBuffer(data, 44100)
+        self.sample_rate = 44100
+        self.live_board = None
+        self.ready_frames = None
+        self.muted = muted
+        self.soloed = soloed
+        self.gain = gain
+
+    def volume(self):
+        return self.gain
+
+
+def make_mixer():
+    rng = np.random.default_rng(0)
+    frames = BLOCK_SIZE * (CALLBACKS + 10)
+    tracks = [
+        FakeTrack(rng.standard_normal((2, frames), dtype=np.float32)),
+        #mono, shorter than the others, so the end-of-track path runs too
+        FakeTrack(rng.standard_normal((1, frames // 2), dtype=np.float32)),
+        FakeTrack(rng.standard_normal((2, frames), dtype=np.float32), muted=True),
+    ]
+    mixer = Mixer(tracks)
+    mixer.update_state()
+    return mixer
+
+
+def allocated_during(fn):
+    """Peak traced memory above the starting point while fn runs."""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def test_callback_does_not_allocate():
+    mixer = make_mixer()
+    outdata = np.zeros((BLOCK_SIZE, mixer.channels), dtype=np.float32)
+    #warm up once, so lazily created state is not counted
+    mixer.audio_callback(outdata, BLOCK_SIZE, None, None)
+
+    def run():
+        for _ in range(CALLBACKS):
+            mixer.audio_callback(outdata, BLOCK_SIZE, None, None)
+
+    assert allocated_during(run) < MAX_ALLOCATED_BYTES
+    assert mixer.position == min((CALLBACKS + 1) * BLOCK_SIZE, mixer.length())
+
+
+def test_seek_crossfade_does_not_allocate():
+    mixer = make_mixer()
+    mixer.is_playing = True
+    outdata = np.zeros((BLOCK_SIZE, mixer.channels), dtype=np.float32)
+    mixer.audio_callback(outdata, BLOCK_SIZE, None, None)
+
+    def run():
+        for i in range(CALLBACKS):
+            if i % 10 == 0:
+                mixer.seek((i * 7919) % mixer.length())
+            mixer.audio_callback(outdata, BLOCK_SIZE, None, None)
+
+    assert allocated_during(run) < MAX_ALLOCATED_BYTES
+
+
+def test_callback_mixes_audible_tracks():
+    mixer = make_mixer()
+    outdata = np.zeros((BLOCK_SIZE, mixer.channels), dtype=np.float32)
+    mixer.audio_callback(outdata, BLOCK_SIZE, None, None)
+    stereo, mono, _ = (t.audio_data.data for t in mixer.tracks)
+    expected = stereo[:, :BLOCK_SIZE].T * 0.5 + mono[:, :BLOCK_SIZE].T * 0.5
+    np.testing.assert_allclose(outdata, expected, rtol=1e-5, atol=1e-6)
@@ -1,4 +1,6 @@
 # utils.py
+import hashlib
+import json
 import os
 import platform
 import shutil
@@ -19,14 +21,84 @@ def get_cache_dir():
     os.makedirs(cache_dir, exist_ok=True)
     return cache_dir
 
+
+#path -> (size, mtime, hash) records, so unchanged inputs are not re-hashed
+HASH_INDEX = "hashes.json"
+HASH_CHUNK = 1 << 20
+HASH_LENGTH = 32
+
+def _load_hash_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_hash_index(index_path, index):
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Content hash of a file, streamed in chunks.
+    Results are remembered per path with the file's size and mtime, so an unchanged file is never re-read.
+    """
+    path = os.path.abspath(file_path)
+    st = os.stat(path)
+    index_path = os.path.join(get_cache_dir(), HASH_INDEX)
+    index = _load_hash_index(index_path)
+    entry = index.get(path)
+    if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+        return entry["hash"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:HASH_LENGTH]
+
+    index[path] = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest}
+    _save_hash_index(index_path, index)
+    return digest
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-link src to dst, falling back to a symlink, then to a copy (e.g. across drives)."""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(src), dst)
+        return
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+
+
+def cached_input_path(file_path: str, ext: str = None) -> str:
+    """Content-addressed path for file_path in the cache's Inputs folder: <hash><ext>."""
+    inputs_dir = os.path.join(get_cache_dir(), "Inputs")
+    os.makedirs(inputs_dir, exist_ok=True)
+    if ext is None:
+        ext = os.path.splitext(file_path)[1].lower()
+    return os.path.join(inputs_dir, hash_file(file_path) + ext)
+
+
 def cache_file(file_path: str) -> str:
-    """Copy the file into the OS-specific cache folder (if not already there) and return the cached path."""
-    cache_dir = get_cache_dir()
-    base_name = os.path.basename(file_path)
-    cached_file = os.path.join(cache_dir, base_name)
-    # Copy if file is not already cached.
+    """
+    Add the file to the cache under its content hash and return the cached path.
+    Identical audio under different names maps to the same entry, and the input is
+    linked rather than copied when the filesystem allows it.
+    """
+    cached_file = cached_input_path(file_path)
     if not os.path.exists(cached_file):
-        shutil.copy2(file_path, cached_file)
+        link_or_copy(file_path, cached_file)
     return cached_file
 
 